@@ -0,0 +1,126 @@
+"""
+Admission control of the computations of scores: at most settings.MAX_CONCURRENT_COMPUTATIONS run at the same time
+in a process, and settings.NODE_MAX_CONCURRENT_COMPUTATIONS on the node when set, the node slots being files locked
+in settings.ADMISSION_LOCK_DIR. Past these limits, at most settings.ADMISSION_QUEUE_SIZE requests wait for a slot
+during settings.ADMISSION_WAIT_TIMEOUT seconds, the other ones are rejected right away.
+Requests answered from the existing scores never go through it.
+"""
+import fcntl
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from django.conf import settings
+
+from api import stats
+from api.exceptions import OverloadedException
+
+_condition = threading.Condition()
+_running = 0
+_waiting = 0
+
+
+def _overloaded(reason: str) -> OverloadedException:
+    stats.increment('admission_rejections')
+    return OverloadedException(settings.ADMISSION_RETRY_AFTER, reason)
+
+
+def _acquire_process_slot(deadline: float) -> None:
+    global _running, _waiting
+    with _condition:
+        if _running < settings.MAX_CONCURRENT_COMPUTATIONS:
+            _running += 1
+            return
+        if _waiting >= settings.ADMISSION_QUEUE_SIZE:
+            raise _overloaded("Admission queue full")
+
+        _waiting += 1
+        stats.increment('admission_waits')
+        try:
+            while _running >= settings.MAX_CONCURRENT_COMPUTATIONS:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise _overloaded("No computation slot freed in time")
+                _condition.wait(remaining)
+            _running += 1
+        finally:
+            _waiting -= 1
+
+
+def _release_process_slot() -> None:
+    global _running
+    with _condition:
+        _running -= 1
+        _condition.notify()
+
+
+def _acquire_node_slot(deadline: float) -> Optional[int]:
+    """
+    :return: The file descriptor holding the lock of the slot, None without limit for the node
+    """
+    if settings.NODE_MAX_CONCURRENT_COMPUTATIONS <= 0:
+        return None
+
+    os.makedirs(settings.ADMISSION_LOCK_DIR, exist_ok=True)
+    while True:
+        for index in range(settings.NODE_MAX_CONCURRENT_COMPUTATIONS):
+            fd = os.open(os.path.join(settings.ADMISSION_LOCK_DIR, f'slot-{index}.lock'), os.O_RDWR | os.O_CREAT)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise _overloaded("No computation slot left on the node")
+        time.sleep(min(remaining, settings.ADMISSION_NODE_POLL_INTERVAL))
+
+
+def acquire() -> Optional[int]:
+    """
+    Wait for the right to start a computation, to be given back with release.
+
+    :raise OverloadedException: If the limits are reached and the computation can't wait
+    """
+    deadline = time.monotonic() + settings.ADMISSION_WAIT_TIMEOUT
+    _acquire_process_slot(deadline)
+    try:
+        node_slot = _acquire_node_slot(deadline)
+    except Exception:
+        _release_process_slot()
+        raise
+    stats.increment('admission_admitted')
+    return node_slot
+
+
+def release(node_slot: Optional[int]) -> None:
+    if node_slot is not None:
+        # Closing the file releases its lock
+        os.close(node_slot)
+    _release_process_slot()
+
+
+@contextmanager
+def computation_slot():
+    node_slot = acquire()
+    try:
+        yield
+    finally:
+        release(node_slot)
+
+
+def snapshot() -> dict:
+    with _condition:
+        running, waiting = _running, _waiting
+    return {
+        'running': running,
+        'waiting': waiting,
+        'max_running': settings.MAX_CONCURRENT_COMPUTATIONS,
+        'max_waiting': settings.ADMISSION_QUEUE_SIZE,
+        'admitted': stats.get('admission_admitted'),
+        'waits': stats.get('admission_waits'),
+        'rejections': stats.get('admission_rejections'),
+    }
@@ -0,0 +1,63 @@
+"""
+HTTP client of the asynchronous scoring, the counterpart of api.http_client for the event loop of the ASGI server.
+Errors are raised as the ones of requests, so that they are handled the same way whichever client was used.
+"""
+import asyncio
+import weakref
+from typing import Optional, Tuple
+
+import aiohttp
+from django.conf import settings
+from requests.exceptions import HTTPError, InvalidSchema, RequestException
+
+from api.http_client import BROWSER_USER_AGENT
+
+# One session per event loop, a session can't be used from another loop
+_sessions = weakref.WeakKeyDictionary()
+
+
+def get_session() -> aiohttp.ClientSession:
+    loop = asyncio.get_event_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=settings.ASYNC_HTTP_CONNECTIONS,
+                limit_per_host=settings.HTTP_POOL_MAXSIZE,
+            ),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=settings.HTTP_CONNECT_TIMEOUT,
+                sock_read=settings.HTTP_READ_TIMEOUT,
+            ),
+            headers={'User-Agent': BROWSER_USER_AGENT},
+        )
+        _sessions[loop] = session
+    return session
+
+
+async def close() -> None:
+    """
+    Close the session of the running event loop, before the loop is closed.
+    """
+    session = _sessions.pop(asyncio.get_event_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+async def get(url: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+              raise_for_status: bool = False) -> Tuple[int, bytes]:
+    """
+    :return: The status and the body of the response
+    """
+    if params is not None:
+        params = {key: str(value) for key, value in params.items()}
+    try:
+        async with get_session().get(url, params=params, headers=headers,
+                                     max_redirects=settings.HTTP_MAX_REDIRECTS) as response:
+            if raise_for_status and response.status >= 400:
+                raise HTTPError(f"{response.status} Error for url: {url}")
+            return response.status, await response.read()
+    except aiohttp.InvalidURL as e:
+        raise InvalidSchema(str(e)) from e
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise RequestException(str(e) or type(e).__name__) from e
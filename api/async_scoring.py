@@ -0,0 +1,182 @@
+"""
+Scoring of the pages on the event loop of the ASGI server: the pages are downloaded and searched with
+api.async_client, while the parsing, the tagging and the database queries run in threads.
+The steps are the same as in WebPage.compute_scores.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import List, Tuple, Union
+
+import goose3
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from requests.exceptions import RequestException
+
+from api import admission, async_client, metrics
+from api.exceptions import OverloadedException
+from api.models import (ExtractedArticle, SearchResult, WebPage, _LeaseHeartbeat, goose, narrow_related_articles,
+                        remaining_wait, search_query)
+
+logger = logging.getLogger(__name__)
+
+# Database queries run in the thread shared by the synchronous code of the requests
+db_sync_to_async = partial(sync_to_async, thread_sensitive=True)
+
+
+def _in_worker_thread(func, *args):
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def _off_loop(func, *args):
+    """
+    Run CPU bound work in a thread of its own, so that neither the event loop nor the database queries wait for it.
+    """
+    return await sync_to_async(_in_worker_thread, thread_sensitive=False)(func, *args)
+
+
+async def extract_article(url: str) -> goose3.article.Article:
+    status, content = await async_client.get(url, raise_for_status=True)
+    return await _off_loop(lambda: goose.extract(url=url, raw_html=content))
+
+
+async def bing_search(url: str, params: dict) -> dict:
+    cached = await db_sync_to_async(SearchResult.lookup)(url, params)
+    if cached is not None:
+        logger.debug("Search results found in cache")
+        return cached
+
+    status, content = await async_client.get(
+        url,
+        params=params,
+        headers={
+            "Ocp-Apim-Subscription-Key": os.getenv("BING_SEARCH_API_KEY"),
+        })
+
+    if status == 200:
+        results = json.loads(content.decode())
+        await db_sync_to_async(SearchResult.store)(url, params, results)
+        return results
+
+    return {'value': []}
+
+
+async def get_related_articles(article, delay) -> dict:
+    return await bing_search(*search_query(article, delay))
+
+
+async def _fetch_related_article(url: str, semaphore: asyncio.Semaphore
+                                 ) -> Tuple[str, Union[goose3.article.Article, Exception]]:
+    async with semaphore:
+        try:
+            return url, await asyncio.wait_for(extract_article(url), settings.RELATED_ARTICLE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return url, RequestException(f"Extraction took more than {settings.RELATED_ARTICLE_TIMEOUT}s")
+        except Exception as e:
+            return url, e
+
+
+async def fetch_related_articles(urls: List[str]) -> List[Tuple[str, Union[goose3.article.Article, Exception]]]:
+    """
+    Same as api.models.fetch_related_articles, with at most settings.ASYNC_RELATED_ARTICLES_CONCURRENCY
+    downloads at a time.
+    """
+    semaphore = asyncio.Semaphore(settings.ASYNC_RELATED_ARTICLES_CONCURRENCY)
+    return list(await asyncio.gather(*(_fetch_related_article(url, semaphore) for url in urls)))
+
+
+async def extract_related_articles(urls: List[str]) -> List[Tuple[str, Union[ExtractedArticle, Exception]]]:
+    """
+    Same as api.models.extract_related_articles.
+    """
+    cached = await db_sync_to_async(ExtractedArticle.lookup)(urls)
+    fetched = {}
+    for url, result in await fetch_related_articles([url for url in OrderedDict.fromkeys(urls) if url not in cached]):
+        if not isinstance(result, Exception):
+            result = ExtractedArticle.from_article(url, result)
+        fetched[url] = result
+    return [(url, cached.get(url) or fetched[url]) for url in urls]
+
+
+async def compute_scores(web_page: WebPage) -> WebPage:
+    try:
+        with metrics.timer('extraction'):
+            article = await extract_article(web_page.url)
+    except RequestException as e:
+        raise web_page._extraction_failed(e)
+
+    web_page._check_article(article)
+
+    with metrics.timer('search'):
+        if settings.BING_SINGLE_QUERY:
+            wide_related_articles = await get_related_articles(article, 30)
+            related_articles = narrow_related_articles(wide_related_articles, article, 7)
+        else:
+            related_articles = await get_related_articles(article, 7)
+
+    if not web_page._has_related_articles(related_articles):
+        logger.debug("No article found, try with a period of 30 days before publishing.")
+        if settings.BING_SINGLE_QUERY:
+            related_articles = wide_related_articles
+        else:
+            with metrics.timer('search'):
+                related_articles = await get_related_articles(article, 30)
+
+        if not web_page._has_related_articles(related_articles):
+            raise await db_sync_to_async(web_page._isolated)()
+
+    with metrics.timer('related_articles'):
+        linked_articles = await extract_related_articles(web_page.linked_urls(related_articles))
+    # The tagging runs in a thread of its own, the queries in the shared one
+    analysis = await _off_loop(web_page._analyze_content, article, linked_articles)
+    await db_sync_to_async(web_page._store_content_score)(analysis)
+    return await db_sync_to_async(web_page._finish_scores)()
+
+
+async def _compute_with_lease(web_page: WebPage) -> WebPage:
+    # The queries run in other threads, only the time is measured
+    start = time.monotonic()
+    try:
+        with _LeaseHeartbeat(web_page):
+            return await compute_scores(web_page)
+    except Exception as e:
+        raise await db_sync_to_async(web_page._failed)(e)
+    finally:
+        metrics.observe('scoring_seconds', time.monotonic() - start)
+
+
+async def from_url(url: str, allow_stale: bool = False) -> WebPage:
+    """
+    Same as WebPage.from_url, the computations in progress being checked again every
+    settings.SINGLE_FLIGHT_POLL_INTERVAL seconds.
+    """
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT
+    waiting = False
+    while True:
+        lookup = db_sync_to_async(WebPage._lookup_for_computation)
+        web_page, must_compute = await lookup(url, allow_stale, waited=waiting)
+        if must_compute:
+            try:
+                node_slot = await sync_to_async(admission.acquire, thread_sensitive=False)()
+            except OverloadedException:
+                await db_sync_to_async(web_page.release_lease)()
+                raise
+            try:
+                return await _compute_with_lease(web_page)
+            finally:
+                admission.release(node_slot)
+        if web_page is not None:
+            return web_page
+        if not waiting:
+            waiting = True
+            metrics.increment('page_lookups', result='computing')
+        await asyncio.sleep(min(remaining_wait(deadline), settings.SINGLE_FLIGHT_POLL_INTERVAL))
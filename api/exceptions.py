@@ -30,3 +30,16 @@ class APIException(Exception):
     def __str__(self):
         return self.message
 
+
+class OverloadedException(APIException):
+    """
+    Raised when a computation can't start because too many are already running.
+    """
+
+    def __init__(self, retry_after: int, internal_message: str = None):
+        """
+        :param retry_after: Seconds after which the request should be sent again
+        """
+        super().__init__(logging.WARNING, "Le service est surchargé. Merci de réessayer dans quelques instants.",
+                         internal_message)
+        self.retry_after = retry_after
@@ -0,0 +1,60 @@
+"""
+State of the process reported to the load balancers by /api/ready.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from api import admission, models
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_database_checked_at = None
+_database_ok = False
+
+
+def database_ok() -> bool:
+    """
+    :return: Whether the database answered a trivial query, checked at most every
+    settings.READINESS_DATABASE_CHECK_INTERVAL seconds
+    """
+    global _database_checked_at, _database_ok
+    with _lock:
+        now = time.monotonic()
+        if _database_checked_at is not None and now - _database_checked_at < settings.READINESS_DATABASE_CHECK_INTERVAL:
+            return _database_ok
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+            _database_ok = True
+        except Exception as e:
+            logger.critical(f"Error while trying to access DB when checking readiness: {e}")
+            _database_ok = False
+        _database_checked_at = now
+        return _database_ok
+
+
+def readiness() -> dict:
+    """
+    The process is ready when the database answers, the NLP model is loaded if it must be,
+    and computations can still wait for a slot.
+    """
+    computations = admission.snapshot()
+    checks = {
+        'database': database_ok(),
+        'nlp_loaded': models.nlp is not None,
+        'accepting_computations': computations['waiting'] < computations['max_waiting'],
+    }
+    ready = (checks['database']
+             and (checks['nlp_loaded'] or not settings.LOAD_NLP)
+             and checks['accepting_computations'])
+    return {
+        'status': 'ready' if ready else 'busy' if checks['database'] else 'unavailable',
+        'checks': checks,
+        'computations': computations,
+    }
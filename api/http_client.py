@@ -0,0 +1,63 @@
+"""
+Process-wide HTTP session used for every outgoing request (extraction of the articles and Bing searches),
+so that connections are kept alive and reused for each host.
+"""
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+BROWSER_USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.14; rv:64.0) Gecko/20100101 Firefox/64.0"
+
+_lock = threading.Lock()
+_session = None
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=settings.HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.max_redirects = settings.HTTP_MAX_REDIRECTS
+                session.headers['User-Agent'] = BROWSER_USER_AGENT
+                # The cookies of a site must not be sent with the next requests, the redirections still get them
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                _session = session
+    return _session
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault('timeout', (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT))
+    return get_session().get(url, **kwargs)
+
+
+def pool_stats() -> list:
+    """
+    :return: For each host the session is connected to, the number of connections opened,
+    the number of requests sent and the number of idle connections available.
+    """
+    if _session is None:
+        return []
+
+    stats = []
+    adapters = {id(adapter): adapter for adapter in _session.adapters.values()}
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            stats.append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'connections': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle': pool.pool.qsize() if pool.pool is not None else 0,
+            })
+    return stats
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.models import ExtractedArticle
+
+
+class Command(BaseCommand):
+    help = 'Displays the extracted articles cache usage, optionally evicting expired entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evict', action='store_true', help='Delete expired and overflowing entries first')
+
+    def handle(self, *args, **options):
+        if options['evict']:
+            deleted = ExtractedArticle.evict()
+            self.stdout.write(self.style.SUCCESS(f'Evicted {deleted} cached articles'))
+        for name, value in ExtractedArticle.cache_stats().items():
+            # Counters of this process are meaningless here
+            if not name.startswith('process_'):
+                self.stdout.write(f'{name}: {value}')
@@ -0,0 +1,46 @@
+import time
+
+import tldextract
+from django.core.management.base import BaseCommand
+
+from api.models import InterestingRelatedArticle, extract_base_domain, get_tld_extract
+
+SAMPLE_URLS = [
+    'https://www.lemonde.fr/politique/article/2019/01/10/article.html',
+    'https://www.lefigaro.fr/actualite-france/2019/01/10/article.php',
+    'https://www.liberation.fr/france/2019/01/10/article_1702187',
+    'https://www.francetvinfo.fr/politique/article.html',
+    'https://actu.orange.fr/france/article.html',
+    'https://www.bbc.co.uk/news/world-europe-46821178',
+]
+
+
+class Command(BaseCommand):
+    help = 'Measures the cost of a base domain resolution, with and without the shared extractor and cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=1000, help='Number of resolutions measured for each method')
+
+    def handle(self, *args, **options):
+        urls = list(InterestingRelatedArticle.objects.values_list('url', flat=True)[:200]) or SAMPLE_URLS
+        calls = [urls[i % len(urls)] for i in range(options['calls'])]
+
+        def new_extractor(url):
+            # What every call to extract_base_domain without extractor used to do
+            return extract_base_domain(url, tldextract.TLDExtract(
+                cache_file='api/external_data/public_suffixes_list.dat',
+                include_psl_private_domains=True
+            ))
+
+        # A new extractor parses the whole list at each call, a few calls are enough to measure it
+        methods = [
+            ('New extractor per call', new_extractor, calls[:min(len(calls), 20)]),
+            ('Shared extractor', lambda url: extract_base_domain(url, get_tld_extract()), calls),
+            ('Shared extractor and cache', extract_base_domain, calls),
+        ]
+        for name, method, method_calls in methods:
+            start = time.perf_counter()
+            for url in method_calls:
+                method(url)
+            duration = time.perf_counter() - start
+            self.stdout.write(f'{name}: {duration * 1e6 / len(method_calls):.1f} µs per call')
@@ -0,0 +1,58 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import similarity
+from api.models import ExtractedArticle
+from api.similarity import SEQUENCE_MATCHER_THRESHOLD
+
+
+class Command(BaseCommand):
+    help = 'Compares the MinHash near-duplicate detection with SequenceMatcher on pairs of cached articles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pairs', type=int, default=200, help='Number of pairs of articles to compare')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        texts = list(ExtractedArticle.objects.exclude(cleaned_text='').values_list('cleaned_text', flat=True)[:1000])
+        if len(texts) < 2:
+            raise CommandError('At least 2 cached articles are needed, score some pages first')
+
+        rand = random.Random(options['seed'])
+        pairs = [tuple(rand.sample(texts, 2)) for _ in range(options['pairs'] // 2)]
+        # The other half are a text and a page copying any part of it, completed with the sentences of another text
+        for _ in range(options['pairs'] - len(pairs)):
+            text, other = rand.sample(texts, 2)
+            sentences = text.split('. ')
+            copied = round(len(sentences) * rand.random())
+            start = rand.randint(0, len(sentences) - copied)
+            own = other.split('. ')[:len(sentences) - copied]
+            pairs.append((text, '. '.join(sentences[start:start + copied] + own)))
+
+        start = time.perf_counter()
+        ratios = [similarity.sequence_ratio(text1, text2) for text1, text2 in pairs]
+        sequence_matcher_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        estimates = [similarity.similarity(similarity.signature(text1), similarity.signature(text2))
+                     for text1, text2 in pairs]
+        minhash_duration = time.perf_counter() - start
+
+        threshold = settings.NEAR_DUPLICATE_THRESHOLD
+        both = sum(1 for r, e in zip(ratios, estimates) if r > SEQUENCE_MATCHER_THRESHOLD and e > threshold)
+        only_ratio = sum(1 for r, e in zip(ratios, estimates) if r > SEQUENCE_MATCHER_THRESHOLD and e <= threshold)
+        only_minhash = sum(1 for r, e in zip(ratios, estimates) if r <= SEQUENCE_MATCHER_THRESHOLD and e > threshold)
+
+        self.stdout.write(f'Pairs compared: {len(pairs)}')
+        self.stdout.write(f'SequenceMatcher: {sequence_matcher_duration * 1000 / len(pairs):.2f} ms per pair')
+        self.stdout.write(f'MinHash (signatures included): {minhash_duration * 1000 / len(pairs):.2f} ms per pair')
+        self.stdout.write(f'Speedup: {sequence_matcher_duration / max(minhash_duration, 1e-9):.1f}x')
+        self.stdout.write(f'Too similar for both: {both}')
+        self.stdout.write(f'Too similar for SequenceMatcher only: {only_ratio}')
+        self.stdout.write(f'Too similar for MinHash only: {only_minhash}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Agreement at threshold {threshold}: {(len(pairs) - only_ratio - only_minhash) / len(pairs):.1%}'
+        ))
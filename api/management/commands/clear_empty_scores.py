@@ -1,11 +1,32 @@
+import datetime
+
 from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
 
 from api.models import WebPage
+from api.utils import delete_by_batches
 
 
 class Command(BaseCommand):
     help = 'Deletes pages with empty content score'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Pages deleted in each batch')
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to wait between two batches')
+        parser.add_argument('--start-pk', type=int, default=0, help='Resume the deletion from this primary key')
+        parser.add_argument('--grace-period', type=int, default=60,
+                            help='Minutes since their last update before pages are deleted, '
+                                 'so that the ones being computed are kept')
+
     def handle(self, *args, **options):
-        res = WebPage.objects.filter(content_score=None).delete()
-        self.stdout.write(self.style.SUCCESS(f'Successfully deleted pages with empty content score {res}'))
+        now = timezone.now()
+        pages = (WebPage.objects
+                 .filter(content_score=None, updated_at__lt=now - datetime.timedelta(minutes=options['grace_period']))
+                 .filter(Q(lease_expires_at=None) | Q(lease_expires_at__lt=now)))
+        total = 0
+        for deleted, last_pk in delete_by_batches(pages, options['batch_size'], options['pause'], options['start_pk']):
+            total += deleted
+            self.stdout.write(f'Deleted {deleted} pages up to pk {last_pk}, {total} so far '
+                              f'(resume with --start-pk {last_pk + 1})')
+        self.stdout.write(self.style.SUCCESS(f'Successfully deleted {total} pages with empty content score'))
@@ -1,11 +1,22 @@
 from django.core.management.base import BaseCommand
 
 from api.models import WebPage
+from api.utils import delete_by_batches
 
 
 class Command(BaseCommand):
     help = 'Deletes pages with old content score'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Pages deleted in each batch')
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to wait between two batches')
+        parser.add_argument('--start-pk', type=int, default=0, help='Resume the deletion from this primary key')
+
     def handle(self, *args, **options):
-        res = WebPage.objects.filter(scores_version__lt=WebPage.CURRENT_SCORES_VERSION - 1).delete()
-        self.stdout.write(self.style.SUCCESS(f'Successfully deleted pages with old content score {res}'))
+        pages = WebPage.objects.filter(scores_version__lt=WebPage.CURRENT_SCORES_VERSION - 1)
+        total = 0
+        for deleted, last_pk in delete_by_batches(pages, options['batch_size'], options['pause'], options['start_pk']):
+            total += deleted
+            self.stdout.write(f'Deleted {deleted} pages up to pk {last_pk}, {total} so far '
+                              f'(resume with --start-pk {last_pk + 1})')
+        self.stdout.write(self.style.SUCCESS(f'Successfully deleted {total} pages with old content score'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.models import BaseDomain, WebPage
+
+
+class Command(BaseCommand):
+    help = 'Computes again the score aggregates of the domains'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Also rebuild aggregates computed for current version')
+
+    def handle(self, *args, **options):
+        domains = BaseDomain.objects.all()
+        if not options['all']:
+            domains = domains.exclude(aggregates_version=WebPage.CURRENT_SCORES_VERSION)
+
+        rebuilt = 0
+        for domain in domains.iterator():
+            domain.rebuild_aggregates()
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt aggregates of {rebuilt} domains'))
@@ -0,0 +1,192 @@
+import datetime
+import json
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from api import models
+from api.exceptions import APIException
+from api.models import WebPage
+from api.utils import RateLimiter, host
+
+# Pending pages looked at to find one whose host isn't throttled
+SCHEDULING_WINDOW = 100
+REPORT_INTERVAL = 10  # seconds
+
+
+def rescore_page(pk: int, url: str) -> Tuple[int, Optional[str], float]:
+    """
+    Compute the scores of a page again, in a process of the pool.
+
+    :return: The primary key of the page, the error message if the scoring failed and the time it took
+    """
+    start = time.monotonic()
+    close_old_connections()
+    try:
+        # The outdated scores are still served if the new ones can't be computed
+        WebPage.from_url(url, force=True, keep_stale=True)
+        error = None
+    except APIException as e:
+        error = e.message
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    return pk, error, time.monotonic() - start
+
+
+class InlineExecutor:
+    """
+    Scores the pages in the process of the command, with --processes 0.
+    """
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait: bool = True) -> None:
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Computes again the scores of outdated pages, downloading and searching everything again'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--version-below', type=int, default=WebPage.CURRENT_SCORES_VERSION,
+                            help='Rescore the pages with a scores version lower than this one, '
+                                 f'{WebPage.CURRENT_SCORES_VERSION + 1} to include the current one')
+        parser.add_argument('--older-than', type=int, help='Only rescore the pages scored more than this many days ago')
+        parser.add_argument('--domain', action='append', help='Only rescore the pages of this domain, can be repeated')
+        parser.add_argument('--limit', type=int, help='Maximum number of pages rescored')
+        parser.add_argument('--processes', type=int, default=2,
+                            help='Number of processes scoring the pages, 0 to score them in this process')
+        parser.add_argument('--per-host-interval', type=float, default=2.0,
+                            help='Minimum number of seconds between two pages of the same host')
+        parser.add_argument('--checkpoint', default='rescore_checkpoint.json',
+                            help='File where the progress is saved')
+        parser.add_argument('--resume', action='store_true', help='Resume from the progress saved in the checkpoint')
+
+    def handle(self, *args, **options):
+        if models.nlp is None:
+            raise CommandError('spaCy is not loaded, run the command with LOAD_NLP=True')
+
+        self.checkpoint_path = options['checkpoint']
+        self.state = {'last_pk': 0, 'rescored': 0, 'failed': 0}
+        if options['resume'] and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as checkpoint:
+                self.state.update(json.load(checkpoint))
+            self.stdout.write(f"Resuming after pk {self.state['last_pk']}")
+
+        pages = self.outdated_pages(options).filter(pk__gt=self.state['last_pk']).order_by('pk')
+        if options['limit']:
+            pages = pages[:options['limit']]
+        todo = deque(pages.values_list('pk', 'url'))
+        # The processes of the pool must not share the connection of this one
+        connection.close()
+
+        total = len(todo)
+        last_pk = todo[-1][0] if todo else self.state['last_pk']
+        self.stdout.write(f'{total} pages to rescore')
+        if options['processes'] > 0:
+            executor = ProcessPoolExecutor(max_workers=options['processes'])
+        else:
+            executor = InlineExecutor()
+        concurrency = max(1, options['processes'])
+        limiter = RateLimiter(options['per_host_interval'])
+
+        in_flight = {}
+        errors = Counter()
+        durations = []
+        start = last_report = time.monotonic()
+        try:
+            while todo or in_flight:
+                throttled_for = None
+                while todo and len(in_flight) < concurrency:
+                    index = self.next_ready(todo, limiter)
+                    if index is None:
+                        throttled_for = min(limiter.delay(host(url)) for _, url in islice(todo, SCHEDULING_WINDOW))
+                        break
+                    pk, url = todo[index]
+                    del todo[index]
+                    limiter.take(host(url))
+                    in_flight[executor.submit(rescore_page, pk, url)] = pk
+
+                if not in_flight:
+                    time.sleep(throttled_for)
+                    continue
+
+                done, _ = wait(in_flight, timeout=throttled_for, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del in_flight[future]
+                    pk, error, duration = future.result()
+                    durations.append(duration)
+                    if error is None:
+                        self.state['rescored'] += 1
+                    else:
+                        self.state['failed'] += 1
+                        errors[error] += 1
+
+                # Every page up to the smallest one not rescored yet is done
+                unfinished = [todo[0][0]] if todo else []
+                unfinished.extend(in_flight.values())
+                if done:
+                    self.state['last_pk'] = max(self.state['last_pk'],
+                                                min(unfinished) - 1 if unfinished else last_pk)
+                    self.save_checkpoint()
+
+                if time.monotonic() - last_report > REPORT_INTERVAL:
+                    last_report = time.monotonic()
+                    self.report(len(durations), total, start)
+        except KeyboardInterrupt:
+            self.stdout.write(f'Interrupted, run again with --resume to continue after pk {self.state["last_pk"]}')
+            executor.shutdown(wait=False)
+            return
+
+        executor.shutdown()
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        self.report(len(durations), total, start)
+        if durations:
+            self.stdout.write(f'Average time per page: {sum(durations) / len(durations):.1f}s')
+        for message, count in errors.most_common(10):
+            self.stdout.write(f'{count} x {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully rescored {self.state['rescored']} pages, {self.state['failed']} failed"))
+
+    @staticmethod
+    def outdated_pages(options):
+        pages = WebPage.objects.exclude(content_score=None).filter(scores_version__lt=options['version_below'])
+        if options['older_than'] is not None:
+            pages = pages.filter(updated_at__lt=timezone.now() - datetime.timedelta(days=options['older_than']))
+        if options['domain']:
+            pages = pages.filter(base_domain__base_domain__in=options['domain'])
+        return pages
+
+    @staticmethod
+    def next_ready(todo: deque, limiter: RateLimiter) -> Optional[int]:
+        """
+        :return: The index of the first pending page whose host can be scored now
+        """
+        for index, (_, url) in enumerate(islice(todo, SCHEDULING_WINDOW)):
+            if limiter.delay(host(url)) == 0:
+                return index
+        return None
+
+    def save_checkpoint(self) -> None:
+        temporary_path = f'{self.checkpoint_path}.tmp'
+        with open(temporary_path, 'w') as checkpoint:
+            json.dump(self.state, checkpoint)
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def report(self, processed: int, total: int, start: float) -> None:
+        elapsed = time.monotonic() - start
+        throughput = processed / elapsed * 60 if elapsed else 0
+        self.stdout.write(f"{processed}/{total} pages in {elapsed:.0f}s ({throughput:.1f} pages/min), "
+                          f"{self.state['failed']} errors")
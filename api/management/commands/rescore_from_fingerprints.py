@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from api.exceptions import APIException
+from api.models import WebPage
+
+
+class Command(BaseCommand):
+    help = ('Computes again the scores of outdated pages from their stored fingerprints, without any network access, '
+            'when their version is in WebPage.FINGERPRINTS_VALID_VERSIONS')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Also rescore pages with current scores version')
+
+    def handle(self, *args, **options):
+        pages = WebPage.objects.exclude(stems=None).exclude(content_score=None)
+        versions = list(WebPage.FINGERPRINTS_VALID_VERSIONS)
+        if options['all']:
+            versions.append(WebPage.CURRENT_SCORES_VERSION)
+        pages = pages.filter(scores_version__in=versions)
+
+        rescored = 0
+        failed = 0
+        for page in pages.iterator():
+            try:
+                page.rescore_from_fingerprints()
+                rescored += 1
+            except APIException as e:
+                self.stderr.write(f'Could not rescore {page.url}: {e.message}')
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully rescored {rescored} pages, {failed} failed'))
@@ -0,0 +1,88 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from api.models import ScoringJob
+
+logger = logging.getLogger(__name__)
+
+# Seconds waited at most after consecutive errors
+MAX_BACKOFF = 60
+
+
+class Command(BaseCommand):
+    help = 'Scores the pages enqueued by the API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.SCORING_WORKER_CONCURRENCY,
+                            help='Number of jobs processed at the same time')
+        parser.add_argument('--once', action='store_true', help='Stop once the queue is empty')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.processed = 0
+        self.purged_at = 0
+        self.lock = threading.Lock()
+
+        threads = [threading.Thread(target=self.work, args=(options['once'],), daemon=True)
+                   for _ in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping after the current jobs')
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully processed {self.processed} jobs'))
+
+    def work(self, once: bool) -> None:
+        failures = 0
+        try:
+            while not self.stop.is_set():
+                try:
+                    if not self.process_next():
+                        if once:
+                            return
+                        self.purge()
+                        self.stop.wait(settings.SCORING_WORKER_POLL_INTERVAL)
+                    failures = 0
+                except Exception:
+                    # The database may be restarting, the thread must go on once it's back
+                    failures += 1
+                    logger.exception("Scoring worker error")
+                    connection.close()
+                    self.stop.wait(min(settings.SCORING_WORKER_POLL_INTERVAL * 2 ** failures, MAX_BACKOFF))
+        finally:
+            connection.close()
+
+    def process_next(self) -> bool:
+        """
+        :return: False if there was no job to run
+        """
+        close_old_connections()
+        job = ScoringJob.claim()
+        if job is None:
+            return False
+
+        start = time.monotonic()
+        job.run()
+        with self.lock:
+            self.processed += 1
+        self.stdout.write(f'{job.url}: {job.status.lower()} in {time.monotonic() - start:.1f}s')
+        return True
+
+    def purge(self) -> None:
+        with self.lock:
+            if time.monotonic() - self.purged_at < 3600:
+                return
+            self.purged_at = time.monotonic()
+        ScoringJob.purge()
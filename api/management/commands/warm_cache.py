@@ -0,0 +1,108 @@
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Set
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from api import models
+from api.exceptions import APIException
+from api.models import WebPage
+from api.utils import RateLimiter
+
+# Urls looked up in each query
+LOOKUP_BATCH_SIZE = 500
+
+
+def read_urls(lines: Iterable[str]) -> List[str]:
+    """
+    :param lines: Urls, one per line, or JSON lines with an url key
+    :return: The urls, without duplicates
+    """
+    urls = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('{'):
+            try:
+                line = json.loads(line).get('url') or ''
+            except ValueError:
+                raise CommandError(f'Invalid JSON line: {line}')
+        if line:
+            urls[line] = True
+    return list(urls)
+
+
+def fresh_urls(urls: List[str]) -> Set[str]:
+    fresh = set()
+    for i in range(0, len(urls), LOOKUP_BATCH_SIZE):
+        fresh.update(WebPage.objects
+                     .filter(WebPage.fresh_filter(), url__in=urls[i:i + LOOKUP_BATCH_SIZE])
+                     .values_list('url', flat=True))
+    return fresh
+
+
+class Command(BaseCommand):
+    help = 'Scores in advance the pages which will be requested, read from a file or from the standard input'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='File with one url per line, or JSON lines with an url key, - for the standard input')
+        parser.add_argument('--concurrency', type=int, default=settings.SCORING_WORKER_CONCURRENCY,
+                            help='Number of pages scored at the same time')
+        parser.add_argument('--rate', type=float, default=1.0, help='Maximum number of pages started per second, 0 for no limit')
+
+    def handle(self, *args, **options):
+        # Every page would fail after its download and its searches otherwise
+        if models.nlp is None:
+            raise CommandError('spaCy is not loaded, run the command with LOAD_NLP=True')
+
+        if options['path'] == '-':
+            urls = read_urls(sys.stdin)
+        else:
+            with open(options['path']) as lines:
+                urls = read_urls(lines)
+
+        fresh = fresh_urls(urls)
+        urls = [url for url in urls if url not in fresh]
+        self.stdout.write(f'{len(fresh)} pages already scored, {len(urls)} to score')
+
+        self.counts = {'scored': 0, 'failed': 0}
+        self.lock = threading.Lock()
+        slots = threading.BoundedSemaphore(options['concurrency'])
+        limiter = RateLimiter(1 / options['rate'] if options['rate'] > 0 else 0)
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            for url in urls:
+                slots.acquire()
+                limiter.wait()
+                executor.submit(self.score, url).add_done_callback(lambda future: slots.release())
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully scored {self.counts['scored']} pages in {elapsed:.0f}s, {self.counts['failed']} failed"))
+
+    def score(self, url: str) -> None:
+        start = time.monotonic()
+        close_old_connections()
+        try:
+            WebPage.from_url(url)
+            result = 'scored'
+            message = ''
+        except APIException as e:
+            result = 'failed'
+            message = f': {e.message}'
+        except Exception as e:
+            result = 'failed'
+            message = f': {type(e).__name__}: {e}'
+        finally:
+            connection.close()
+
+        with self.lock:
+            self.counts[result] += 1
+        self.stdout.write(f'{url}: {result} in {time.monotonic() - start:.1f}s{message}')
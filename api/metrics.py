@@ -0,0 +1,364 @@
+"""
+Counters and histograms of the process, exposed in the Prometheus text format by /metrics.
+Every process recording metrics writes them in settings.METRICS_DIR every settings.METRICS_FLUSH_INTERVAL seconds and
+when it exits, so that the endpoint can sum the ones of all the gunicorn workers whichever answers. The files of the
+dead processes are summed in a single archive.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+
+from api import stats
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'fake_news_detector'
+SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, math.inf)
+QUERIES_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, math.inf)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Counters and histograms of the dead processes, their files being merged in it
+ARCHIVE = 'archive.json'
+
+_lock = threading.Lock()
+_counters = Counter()
+# Count of the observations of each bucket, not cumulated, then their sum and their number
+_histograms = {}
+# Serializes the writes of the metrics file of the process
+_flush_lock = threading.Lock()
+# Process whose metrics are written by the flusher thread, a forked process needs a thread of its own
+_flusher_pid = None
+# Identifies the process among the ones which had its pid, by pid as a forked process needs its own
+_tokens = {}
+
+
+def _labels(labels: dict) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def increment(name: str, value: int = 1, **labels) -> None:
+    with _lock:
+        _counters[(name, _labels(labels))] += value
+    _start_flusher()
+
+
+def observe(name: str, value: float, buckets: Tuple[float, ...] = SECONDS_BUCKETS, **labels) -> None:
+    key = (name, _labels(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0,
+                                            'count': 0}
+        for index, bound in enumerate(histogram['buckets']):
+            if value <= bound:
+                histogram['counts'][index] += 1
+                break
+        histogram['sum'] += value
+        histogram['count'] += 1
+    _start_flusher()
+
+
+@contextmanager
+def timer(stage: str):
+    """
+    Time a stage of the computation of the scores.
+    """
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe('scoring_stage_seconds', time.monotonic() - start, stage=stage)
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def scoring():
+    """
+    Time a whole computation of the scores and count the database queries it runs in this thread.
+    """
+    queries = _QueryCounter()
+    start = time.monotonic()
+    try:
+        with connection.execute_wrapper(queries):
+            yield
+    finally:
+        observe('scoring_seconds', time.monotonic() - start)
+        observe('scoring_queries', queries.count, buckets=QUERIES_BUCKETS)
+
+
+def _gauges() -> Dict[Tuple[str, Labels], float]:
+    # Imported here, these modules use this one
+    from api import admission, models
+
+    computations = admission.snapshot()
+    return {
+        ('computations_running', ()): computations['running'],
+        ('computations_waiting', ()): computations['waiting'],
+        ('stems_cache_size', ()): models.stems_cache_stats()['size'],
+        ('base_domains_cache_size', ()): models.base_domains_cache_stats()['size'],
+    }
+
+
+def _cache_counters() -> Dict[Tuple[str, Labels], int]:
+    """
+    :return: The hits and misses of the in-process caches, their hit ratio being computed from them
+    """
+    from api import models
+
+    counters = {}
+    for cache_name, cache_stats in (('stems_cache', models.stems_cache_stats()),
+                                    ('base_domains_cache', models.base_domains_cache_stats())):
+        counters[(f'{cache_name}_hits', ())] = cache_stats['hits']
+        counters[(f'{cache_name}_misses', ())] = cache_stats['misses']
+    return counters
+
+
+def _state() -> dict:
+    """
+    :return: The metrics of the process, serializable to JSON
+    """
+    with _lock:
+        counters = [[name, labels, value] for (name, labels), value in _counters.items()]
+        histograms = [[name, labels, [bound if bound != math.inf else 'inf' for bound in histogram['buckets']],
+                       list(histogram['counts']), histogram['sum'], histogram['count']]
+                      for (name, labels), histogram in _histograms.items()]
+    counters.extend([name, (), value] for name, value in stats.snapshot().items())
+    counters.extend([name, labels, value] for (name, labels), value in _cache_counters().items())
+    gauges = [[name, labels, value] for (name, labels), value in _gauges().items()]
+    return {'pid': os.getpid(), 'token': _token(), 'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+
+def _token() -> str:
+    return _tokens.setdefault(os.getpid(), uuid.uuid4().hex)
+
+
+@contextmanager
+def _directory_lock():
+    """
+    Serialize the changes of the files of settings.METRICS_DIR between the processes.
+    """
+    with open(os.path.join(settings.METRICS_DIR, '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read(path: str) -> Optional[dict]:
+    try:
+        with open(path) as metrics_file:
+            return json.load(metrics_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path: str, state: dict) -> None:
+    with open(f'{path}.tmp', 'w') as metrics_file:
+        json.dump(state, metrics_file)
+    os.replace(f'{path}.tmp', path)
+
+
+def _archive(states: List[dict]) -> None:
+    """
+    Add the counters and histograms of dead processes to the archive, the directory being locked.
+    """
+    path = os.path.join(settings.METRICS_DIR, ARCHIVE)
+    archived = _read(path)
+    counters, _, histograms = _merge(states + [archived] if archived is not None else states)
+    _write(path, {
+        'pid': None,
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, histogram['buckets'], histogram['counts'], histogram['sum'],
+                        histogram['count']] for (name, labels), histogram in histograms.items()],
+        'gauges': [],
+    })
+
+
+def flush() -> None:
+    if not settings.METRICS_DIR:
+        return
+    with _flush_lock:
+        try:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+            state = _state()
+            with _directory_lock():
+                previous = _read(path)
+                # Left by a dead process which had the same pid
+                if previous is not None and previous.get('token') != state['token']:
+                    _archive([previous])
+                _write(path, state)
+        except OSError as e:
+            logger.warning(f"Could not write metrics: {e}")
+
+
+def _flush_periodically() -> None:
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        flush()
+
+
+def _start_flusher() -> None:
+    """
+    Write the metrics of the process in the background, even when it stops recording them.
+    """
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_periodically, name='metrics-flusher', daemon=True).start()
+
+
+def _flush_at_exit() -> None:
+    # Only the processes which recorded metrics, every management command would leave a file otherwise
+    if _flusher_pid == os.getpid():
+        flush()
+
+
+atexit.register(_flush_at_exit)
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _states() -> List[dict]:
+    """
+    :return: The metrics of every process, the files of the dead ones being merged in the archive
+    """
+    if not settings.METRICS_DIR:
+        return [_state()]
+
+    flush()
+    states = []
+    dead = {}
+    with _directory_lock():
+        for file_name in os.listdir(settings.METRICS_DIR):
+            if not file_name.endswith('.json') or file_name == ARCHIVE:
+                continue
+            path = os.path.join(settings.METRICS_DIR, file_name)
+            state = _read(path)
+            if state is None:
+                continue
+            if _is_alive(state['pid']):
+                states.append(state)
+            else:
+                dead[path] = state
+        if dead:
+            _archive(list(dead.values()))
+            for path in dead:
+                os.remove(path)
+        archived = _read(os.path.join(settings.METRICS_DIR, ARCHIVE))
+    if archived is not None:
+        states.append(archived)
+    return states
+
+
+def _name(name: str) -> str:
+    return f"{PREFIX}_{re.sub('[^a-zA-Z0-9_]', '_', name)}"
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, value.replace('\\', '\\\\').replace('"', '\\"'))
+                          for key, value in labels) + '}'
+
+
+def _format_bound(bound) -> str:
+    return '+Inf' if bound in ('inf', math.inf) else repr(float(bound))
+
+
+def _merge(states: Iterable[dict]) -> Tuple[Counter, Counter, dict]:
+    """
+    :return: The sums of the counters, gauges and histograms of the processes
+    """
+    counters = Counter()
+    gauges = Counter()
+    histograms = {}
+    for state in states:
+        for name, labels, value in state['counters']:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, value in state['gauges']:
+            gauges[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, buckets, counts, total, count in state['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            histogram = histograms.setdefault(key, {'buckets': buckets, 'counts': [0] * len(buckets),
+                                                    'sum': 0.0, 'count': 0})
+            histogram['counts'] = [a + b for a, b in zip(histogram['counts'], counts)]
+            histogram['sum'] += total
+            histogram['count'] += count
+    return counters, gauges, histograms
+
+
+def render() -> str:
+    """
+    :return: The metrics of all the processes, in the Prometheus text format
+    """
+    counters, gauges, histograms = _merge(_states())
+
+    lines = []
+    typed = set()
+
+    def declare(name: str, metric_type: str) -> None:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {name} {metric_type}')
+
+    for (name, labels), value in sorted(counters.items()):
+        declare(_name(name) + '_total', 'counter')
+        lines.append(f'{_name(name)}_total{_format_labels(labels)} {value}')
+    for (name, labels), value in sorted(gauges.items()):
+        declare(_name(name), 'gauge')
+        lines.append(f'{_name(name)}{_format_labels(labels)} {value}')
+    for (name, labels), histogram in sorted(histograms.items()):
+        declare(_name(name), 'histogram')
+        cumulated = 0
+        for bound, count in zip(histogram['buckets'], histogram['counts']):
+            cumulated += count
+            bucket_labels = list(labels) + [('le', _format_bound(bound))]
+            lines.append(f'{_name(name)}_bucket{_format_labels(bucket_labels)} {cumulated}')
+        lines.append(f"{_name(name)}_sum{_format_labels(labels)} {histogram['sum']}")
+        lines.append(f"{_name(name)}_count{_format_labels(labels)} {histogram['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+def reset() -> None:
+    """
+    Forget the metrics of the process, for the tests.
+    """
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
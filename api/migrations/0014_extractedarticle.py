@@ -0,0 +1,27 @@
+# Generated by Django 2.1.4 on 2026-10-18 02:53
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_auto_20181213_1305'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedArticle',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500, unique=True)),
+                ('title', models.CharField(max_length=500)),
+                ('cleaned_text', models.TextField()),
+                ('stems', models.TextField(blank=True, null=True)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
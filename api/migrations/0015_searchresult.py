@@ -0,0 +1,25 @@
+# Generated by Django 2.1.4 on 2026-10-18 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_extractedarticle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40, unique=True)),
+                ('endpoint', models.URLField()),
+                ('query', models.CharField(max_length=500)),
+                ('since', models.FloatField(blank=True, null=True)),
+                ('response', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
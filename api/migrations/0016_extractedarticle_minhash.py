@@ -0,0 +1,18 @@
+# Generated by Django 2.1.4 on 2026-10-18 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_searchresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractedarticle',
+            name='minhash',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
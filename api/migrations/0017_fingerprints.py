@@ -0,0 +1,29 @@
+# Generated by Django 2.1.4 on 2026-10-18 02:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_extractedarticle_minhash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webpage',
+            name='stems',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ScoredRelatedArticle',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500)),
+                ('title', models.CharField(max_length=500)),
+                ('stems', models.TextField()),
+                ('web_page', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scored_related_articles', to='api.webpage')),
+            ],
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 2.1.4 on 2026-10-18 02:59
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+# WebPage.CURRENT_SCORES_VERSION when the aggregates were added, the domains of later versions are rebuilt anyway
+SCORES_VERSION = 14
+
+
+def forwards(apps, schema_editor):
+    BaseDomain = apps.get_model('api', 'BaseDomain')
+    db_alias = schema_editor.connection.alias
+
+    for domain in BaseDomain.objects.using(db_alias).all():
+        scores = (domain.web_pages
+                  .filter(scores_version=SCORES_VERSION)
+                  .exclude(content_score=None)
+                  .aggregate(scores_sum=Sum('content_score'), scores_count=Count('pk')))
+        domain.scores_sum = scores['scores_sum'] or 0
+        domain.scores_count = scores['scores_count']
+        domain.web_pages_count = domain.web_pages.count()
+        domain.isolated_count = domain.isolated_articles.count()
+        domain.aggregates_version = SCORES_VERSION
+        domain.save()
+
+
+def backwards(apps, schema_editor):
+    return
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_fingerprints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='basedomain',
+            name='aggregates_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='basedomain',
+            name='isolated_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='basedomain',
+            name='scores_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='basedomain',
+            name='scores_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='basedomain',
+            name='web_pages_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(forwards, backwards),
+    ]
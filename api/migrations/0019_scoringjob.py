@@ -0,0 +1,29 @@
+# Generated by Django 2.1.4 on 2026-10-18 03:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_domain_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoringJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(db_index=True, max_length=500)),
+                ('status', models.CharField(choices=[('PENDING', 'pending'), ('RUNNING', 'running'), ('DONE', 'done'), ('FAILED', 'failed')], default='PENDING', max_length=10)),
+                ('level', models.PositiveIntegerField(blank=True, null=True)),
+                ('message', models.TextField(blank=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('web_page', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='api.webpage')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.4 on 2026-10-18 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_webpage_lease_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scoringjob',
+            name='not_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
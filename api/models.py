@@ -1,34 +1,45 @@
 # coding: utf8
 import datetime
+import hashlib
+import json
 import logging
+import math
 import os
 import re
-from collections import Counter
-from difflib import SequenceMatcher
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import lru_cache
 from statistics import mean
-from typing import List, Union
-from urllib.parse import urlparse
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlparse, urlsplit
 
 import goose3
-import requests
 import spacy
 import tldextract
 from django.conf import settings
-from django.db import models
-from django.db.models import Avg, QuerySet
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from goose3 import Goose
 from nltk.stem.snowball import SnowballStemmer
 from requests.exceptions import InvalidSchema, RequestException
 from unidecode import unidecode
 
-from api.exceptions import APIException
+from api import admission, http_client, metrics, page_cache, similarity, stats
+from api.exceptions import APIException, OverloadedException
+from api.utils import ChoiceEnum, canonical_url, dump_counter, load_counter
 
 logger = logging.getLogger(__name__)
 
 NEWS_URL = "https://api.cognitive.microsoft.com/bing/v7.0/news/search"
 SEARCH_URL = "https://api.cognitive.microsoft.com/bing/v7.0/search"
+# Only used to parse the pages, which are downloaded with the shared HTTP session
+goose = Goose({'browser_user_agent': http_client.BROWSER_USER_AGENT})
 
+nlp = None
 if settings.LOAD_NLP:
     logger.debug("loading NLP")
     nlp = spacy.load('fr')
@@ -36,8 +47,50 @@ if settings.LOAD_NLP:
     nlp.remove_pipe('ner')
     logger.debug("Finished loading NLP")
 
+stemmer = SnowballStemmer("french")
+
+# Called with the name of each step of the computation of the scores and its details
+Progress = Callable[[str, dict], None]
+
+
+def report(progress: Optional[Progress], step: str, **details) -> None:
+    if progress is not None:
+        progress(step, details)
+
+
+@lru_cache(maxsize=settings.STEMS_CACHE_SIZE)
+def stem(word: str) -> str:
+    return stemmer.stem(word)
+
+
+def stem_words(words: List[str]) -> List[str]:
+    """
+    Stem a whole list of words, each distinct word being stemmed only once.
+    """
+    stems = {word: stem(word) for word in set(words)}
+    return [stems[word] for word in words]
+
+
+def stems_cache_stats() -> dict:
+    info = stem.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'max_size': info.maxsize,
+        'hit_ratio': info.hits / lookups if lookups else 0.0,
+    }
+
 
 def get_related_articles(article, delay) -> dict:
+    return bing_search(*search_query(article, delay))
+
+
+def search_query(article, delay) -> Tuple[str, dict]:
+    """
+    :return: The Bing endpoint and the parameters of the search of the articles related to the given one
+    """
     title = article.title
     logger.debug("Title of the article : %s", title)
     # Construct the url for the GET request
@@ -55,67 +108,422 @@ def get_related_articles(article, delay) -> dict:
             params['since'] = (article.publish_datetime_utc - datetime.timedelta(days=delay)).timestamp()
             url = NEWS_URL
 
-    response = requests.get(
-        url=url,
+    return url, params
+
+
+def bing_search(url: str, params: dict) -> dict:
+    cached = SearchResult.lookup(url, params)
+    if cached is not None:
+        logger.debug("Search results found in cache")
+        return cached
+
+    response = http_client.get(
+        url,
         params=params,
         headers={
             "Ocp-Apim-Subscription-Key": os.getenv("BING_SEARCH_API_KEY"),
         })
 
     if response.status_code == 200:
-        return response.json()
+        results = response.json()
+        SearchResult.store(url, params, results)
+        return results
 
     return {'value': []}
 
 
-def extract_base_domain(url, tld_extract=None):
-    if tld_extract is None:
-        tld_extract = tldextract.TLDExtract(
-            cache_file='api/external_data/public_suffixes_list.dat',
-            include_psl_private_domains=True
-        )
-    url_extraction = tld_extract(url)
+def narrow_related_articles(related_articles: dict, article, delay) -> dict:
+    """
+    Keep only the related articles that a search over `delay` days would have returned,
+    based on their publication date. Articles without a readable date are kept.
+    """
+    if article.publish_datetime_utc is None:
+        return related_articles
+
+    since = article.publish_datetime_utc - datetime.timedelta(days=delay)
+    value = []
+    for related_article in related_articles.get('value', []):
+        date_published = related_article.get('datePublished')
+        try:
+            # Bing returns dates like 2019-01-10T12:34:56.0000000Z
+            published = datetime.datetime.strptime(str(date_published)[:19], '%Y-%m-%dT%H:%M:%S')
+        except ValueError:
+            published = None
+        if published is None or published.replace(tzinfo=datetime.timezone.utc) >= since:
+            value.append(related_article)
+    return dict(related_articles, value=value)
+
+
+def extract_article(url: str) -> goose3.article.Article:
+    response = http_client.get(url)
+    response.raise_for_status()
+    return goose.extract(url=url, raw_html=response.content)
+
+
+def fetch_related_articles(urls: List[str]) -> List[Tuple[str, Union[goose3.article.Article, Exception]]]:
+    """
+    Extract the given urls concurrently, at most settings.RELATED_ARTICLES_WORKERS at a time.
+    Results are returned in the same order as the urls, an exception standing for the article
+    when the extraction failed or didn't finish in time.
+    """
+    if not urls:
+        return []
+
+    workers = max(1, min(settings.RELATED_ARTICLES_WORKERS, len(urls)))
+    # Every link gets RELATED_ARTICLE_TIMEOUT seconds, links being processed by batches of `workers`
+    deadline = time.monotonic() + settings.RELATED_ARTICLE_TIMEOUT * math.ceil(len(urls) / workers)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = [(url, executor.submit(extract_article, url)) for url in urls]
+
+    results = []
+    for url, future in futures:
+        try:
+            results.append((url, future.result(timeout=max(0.0, deadline - time.monotonic()))))
+        except FutureTimeoutError:
+            future.cancel()
+            results.append((url, RequestException(f"Extraction took more than {settings.RELATED_ARTICLE_TIMEOUT}s")))
+        except Exception as e:
+            results.append((url, e))
+
+    # Don't wait for the extractions that timed out, they will finish in the background
+    executor.shutdown(wait=False)
+    return results
+
+
+def extract_related_articles(urls: List[str]) -> List[Tuple[str, Union['ExtractedArticle', Exception]]]:
+    """
+    Same as fetch_related_articles, except that the articles recently extracted are read from the cache.
+    The new extractions must be added to the cache with ExtractedArticle.store once processed.
+    """
+    cached = ExtractedArticle.lookup(urls)
+    fetched = {}
+    for url, result in fetch_related_articles([url for url in OrderedDict.fromkeys(urls) if url not in cached]):
+        if not isinstance(result, Exception):
+            result = ExtractedArticle.from_article(url, result)
+        fetched[url] = result
+    return [(url, cached.get(url) or fetched[url]) for url in urls]
+
+
+_tld_extract = None
+_tld_extract_lock = threading.Lock()
+
+
+def get_tld_extract() -> tldextract.TLDExtract:
+    """
+    :return: The extractor of the process, the public suffix list being parsed on first use only
+    """
+    global _tld_extract
+    if _tld_extract is None:
+        with _tld_extract_lock:
+            if _tld_extract is None:
+                _tld_extract = tldextract.TLDExtract(
+                    cache_file='api/external_data/public_suffixes_list.dat',
+                    include_psl_private_domains=True
+                )
+    return _tld_extract
+
+
+@lru_cache(maxsize=settings.BASE_DOMAINS_CACHE_SIZE)
+def _host_base_domain(host: str) -> str:
+    url_extraction = get_tld_extract()(host)
     return f"{url_extraction.domain}.{url_extraction.suffix}".lower()
 
 
+def extract_base_domain(url, tld_extract=None):
+    if tld_extract is not None:
+        url_extraction = tld_extract(url)
+        return f"{url_extraction.domain}.{url_extraction.suffix}".lower()
+
+    # Only the host matters, so that the results can be cached for every page of a site
+    netloc = urlsplit(url).netloc if '//' in url else url.split('/')[0]
+    return _host_base_domain(netloc.rsplit('@', 1)[-1].split(':')[0].lower())
+
+
+def base_domains_cache_stats() -> dict:
+    info = _host_base_domain.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'max_size': info.maxsize,
+        'hit_ratio': info.hits / lookups if lookups else 0.0,
+    }
+
+
+class ContentAnalysis:
+    """
+    Related articles of a page sorted out by WebPage._analyze_content, and the nouns of the page.
+    """
+
+    def __init__(self):
+        # Related articles which aren't blocked, to store
+        self.extracted_articles = []
+        # Url and article of the related articles taken into account in the score
+        self.candidate_articles = []
+        self.blocked_counter = 0
+        self.too_similar_counter = 0
+        self.counter_nouns_article = Counter()
+
+
+class _Computation:
+    def __init__(self):
+        self.done = threading.Event()
+        self.exception = None
+
+
+# Computations in progress in this process, by url
+_computations = {}
+_computations_lock = threading.Lock()
+
+
+def remaining_wait(deadline: float) -> float:
+    """
+    :return: The time left to wait for a computation in progress
+    :raise APIException: If there is none
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise APIException.info('Cet article est en cours de traitement. '
+                                'Merci de réessayer dans quelques minutes.')
+    return remaining
+
+
+def _wait_for_computation(url: str, timeout: float) -> None:
+    """
+    Wait for the end of the computation of the url if it's made by this process,
+    or a bit before checking the database again otherwise.
+    """
+    with _computations_lock:
+        computation = _computations.get(url)
+    if computation is None:
+        time.sleep(min(timeout, settings.SINGLE_FLIGHT_POLL_INTERVAL))
+        return
+
+    computation.done.wait(timeout)
+    if computation.exception is not None:
+        raise computation.exception
+
+
+class _LeaseHeartbeat:
+    """
+    Renew the lease of a page in a background thread while its scores are computed.
+    """
+
+    def __init__(self, web_page: 'WebPage'):
+        self.web_page = web_page
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self) -> None:
+        try:
+            while not self.stopped.wait(settings.SCORING_LEASE_DURATION / 3):
+                # The lease is removed when the computation ends, it must not be set again
+                (WebPage.objects
+                 .filter(pk=self.web_page.pk, lease_expires_at__isnull=False)
+                 .update(lease_expires_at=timezone.now()
+                         + datetime.timedelta(seconds=settings.SCORING_LEASE_DURATION)))
+        finally:
+            connection.close()
+
+
+# Refreshes of stale pages scheduled in this process, by url
+_refreshes = set()
+_refreshes_lock = threading.Lock()
+_refresh_executor = None
+
+
+def _get_refresh_executor() -> ThreadPoolExecutor:
+    global _refresh_executor
+    with _refreshes_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=settings.STALE_REFRESH_WORKERS)
+        return _refresh_executor
+
+
+def _refresh(url: str) -> None:
+    try:
+        # The stale scores are still better than none
+        WebPage.from_url(url, keep_stale=True)
+        stats.increment('stale_refreshes')
+    except APIException as e:
+        message = ' - '.join(filter(None, [e.message, e.internal_message, url]))
+        logger.log(e.level, f"Refresh failed: {message}")
+    except Exception:
+        logger.exception(f"Refresh failed: {url}")
+    finally:
+        with _refreshes_lock:
+            _refreshes.discard(url)
+        connection.close()
+
+
+def schedule_refresh(url: str) -> None:
+    """
+    Compute the scores of a stale page again in the background: with the score_worker command
+    if the scoring is asynchronous, in a thread of this process otherwise.
+    """
+    if settings.ASYNC_SCORING:
+        ScoringJob.enqueue(url)
+        return
+
+    with _refreshes_lock:
+        if url in _refreshes:
+            return
+        _refreshes.add(url)
+    logger.info(f"Scheduled refresh of {url}")
+    _get_refresh_executor().submit(_refresh, url)
+
+
 class BaseDomain(models.Model):
     base_domain = models.CharField(max_length=250)
+    # Aggregates of the pages of the domain, kept up to date by api.signals.
+    # Scores ones only take into account the pages with the scores version they were computed for.
+    scores_sum = models.PositiveIntegerField(default=0)
+    scores_count = models.PositiveIntegerField(default=0)
+    web_pages_count = models.PositiveIntegerField(default=0)
+    isolated_count = models.PositiveIntegerField(default=0)
+    aggregates_version = models.PositiveIntegerField(default=0)
+
+    def ensure_aggregates(self) -> None:
+        if self.aggregates_version != WebPage.CURRENT_SCORES_VERSION:
+            self.rebuild_aggregates()
+
+    def rebuild_aggregates(self) -> None:
+        with transaction.atomic():
+            # Lock the domain so that no page update is lost while counting
+            BaseDomain.objects.select_for_update().filter(pk=self.pk).first()
+            scores = (self.web_pages
+                      .filter(scores_version=WebPage.CURRENT_SCORES_VERSION)
+                      .exclude(content_score=None)
+                      .aggregate(scores_sum=Sum('content_score'), scores_count=Count('pk')))
+            self.scores_sum = scores['scores_sum'] or 0
+            self.scores_count = scores['scores_count']
+            self.web_pages_count = self.web_pages.count()
+            self.isolated_count = self.isolated_articles.count()
+            self.aggregates_version = WebPage.CURRENT_SCORES_VERSION
+            self.save(update_fields=[
+                'scores_sum', 'scores_count', 'web_pages_count', 'isolated_count', 'aggregates_version'
+            ])
+
+    @classmethod
+    def update_aggregates(cls, pk: int, web_pages: int = 0, isolated: int = 0,
+                          removed_score: Optional[int] = None, added_score: Optional[int] = None) -> None:
+        # Counters which drifted never go below 0, rebuild_aggregates fixes them
+        counts = {}
+        if web_pages:
+            counts['web_pages_count'] = Greatest(F('web_pages_count') + web_pages, 0)
+        if isolated:
+            counts['isolated_count'] = Greatest(F('isolated_count') + isolated, 0)
+        if counts:
+            cls.objects.filter(pk=pk).update(**counts)
+
+        scores_count = (added_score is not None) - (removed_score is not None)
+        scores_sum = (added_score or 0) - (removed_score or 0)
+        if scores_count or scores_sum:
+            # Outdated aggregates will be rebuilt anyway
+            (cls.objects
+             .filter(pk=pk, aggregates_version=WebPage.CURRENT_SCORES_VERSION)
+             .update(scores_sum=Greatest(F('scores_sum') + scores_sum, 0),
+                     scores_count=Greatest(F('scores_count') + scores_count, 0)))
+
+    @classmethod
+    def get_or_create_many(cls, names: Iterable[str]) -> Dict[str, 'BaseDomain']:
+        """
+        Same as get_or_create for several domains at once, in a constant number of queries.
+        """
+        names = set(names)
+        base_domains = {}
+        for base_domain in cls.objects.filter(base_domain__in=names).order_by('pk'):
+            base_domains.setdefault(base_domain.base_domain, base_domain)
+
+        missing = [name for name in names if name not in base_domains]
+        if missing:
+            cls.objects.bulk_create([cls(base_domain=name) for name in missing])
+            # bulk_create only sets the primary keys with PostgreSQL
+            for base_domain in cls.objects.filter(base_domain__in=missing).order_by('pk'):
+                base_domains.setdefault(base_domain.base_domain, base_domain)
+        return base_domains
 
     @property
     def isolated_articles_count(self):
-        return self.isolated_articles.count()
+        self.ensure_aggregates()
+        return self.isolated_count
 
     @property
     def total_articles_count(self):
-        return self.isolated_articles_count + self.web_pages.count()
+        return self.isolated_articles_count + self.web_pages_count
 
     @property
     def isolated_articles_ratio(self):
         return self.isolated_articles_count / self.total_articles_count
 
+    @property
+    def site_score(self) -> Optional[float]:
+        """
+        :return: The average score of the pages of the domain, None if none is scored with the current version
+        """
+        self.ensure_aggregates()
+        if self.scores_count == 0:
+            return None
+        return int(self.scores_sum / self.scores_count * 10) / 10
+
     def __str__(self):
         return self.base_domain
 
 
 class WebPage(models.Model):
-    CURRENT_SCORES_VERSION = 14
+    CURRENT_SCORES_VERSION = 15
+    # Previous versions whose stored fingerprints are still valid, the versions since changing only the scoring
+    # and not the extraction, the search, the tagging or the filtering of the related articles
+    FINGERPRINTS_VALID_VERSIONS = ()
 
     url = models.URLField(unique=True, max_length=500)
     content_score = models.PositiveIntegerField(blank=True, null=True)
     base_domain = models.ForeignKey(BaseDomain, on_delete=models.PROTECT, related_name='web_pages')
     scores_version = models.PositiveIntegerField()
     total_articles = models.IntegerField()
+    # Stems of the nouns of the article, to compute the scores again without fetching it
+    stems = models.TextField(blank=True, null=True)
+    # Set while the scores are being computed, renewed regularly by the computation
+    lease_expires_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def _site_score_queryset(self) -> Union[QuerySet, List['WebPage']]:
-        return (WebPage.objects
-                .filter(scores_version=WebPage.CURRENT_SCORES_VERSION)
-                .filter(base_domain=self.base_domain))
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Score of the page as taken into account in the aggregates of its domain
+        self._aggregated_score = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._aggregated_score = instance.aggregable_score
+        return instance
+
+    @property
+    def aggregable_score(self) -> Optional[int]:
+        if self.scores_version != WebPage.CURRENT_SCORES_VERSION or self.content_score is None:
+            return None
+        # Same conversion as the one made when saving
+        return int(self.content_score)
+
+    def save(self, *args, **kwargs):
+        # The aggregates of the domain are updated in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     @property
     def site_score_articles_count(self) -> int:
-        return self._site_score_queryset().count()
+        self.base_domain.ensure_aggregates()
+        return self.base_domain.scores_count
 
     @property
     def interesting_related_articles_count(self) -> int:
@@ -123,10 +531,11 @@ class WebPage(models.Model):
 
     @property
     def site_score(self) -> float:
-        raw_site_score = (self._site_score_queryset()
-                          .aggregate(site_score=Avg('content_score'))
-                          )['site_score']
-        return int(raw_site_score * 10) / 10
+        site_score = self.base_domain.site_score
+        if site_score is None:
+            # Stale page of a domain without any page scored with the current version
+            return float(self.content_score)
+        return site_score
 
     @property
     def isolated_articles_score(self):
@@ -134,88 +543,101 @@ class WebPage(models.Model):
 
     @property
     def global_score(self) -> float:
+        return self._global_score(self.site_score, self.isolated_articles_score)
+
+    def _global_score(self, site_score: float, isolated_articles_score: float) -> float:
         # allows to focus on the content if the site is "serious" and to focus on the site otherwise
 
-        final_score = (self.isolated_articles_score / 2
-                       + ((100 - self.site_score) / 100 * self.site_score
-                          + self.site_score * self.content_score / 100) / 2)
+        final_score = (isolated_articles_score / 2
+                       + ((100 - site_score) / 100 * site_score
+                          + site_score * self.content_score / 100) / 2)
         return int(final_score * 10) / 10
 
     @staticmethod
     def tokens(text) -> List[str]:
-        root_words = []
-        stemmer = SnowballStemmer("french")
-        for i in range(len(text)):
-            root_words.append(stemmer.stem(text[i]))
-        return root_words
+        return stem_words(text)
 
     @staticmethod
     def nouns(text) -> List[str]:
-        nouns = []
-        articleWithoutSpecialCaracters = unidecode(text)
-        document = re.sub('[^A-Za-z .\-]+', ' ', articleWithoutSpecialCaracters)
-        document = ' '.join(document.split())
-        doc = nlp(document)
-        nouns += [w.text for w in doc if ((w.pos_ == "NOUN" or w.pos_ == "PROPN") and len(w.text) > 1)]
-        return nouns
-
-    def compute_scores(self) -> 'WebPage':
+        return WebPage.nouns_batch([text])[0]
+
+    @staticmethod
+    def nouns_batch(texts: List[str]) -> List[List[str]]:
+        """
+        Tag all the texts in one pass through spaCy, which is much faster than one call per text.
+        :return: The nouns of each text, in the same order as the texts
+        """
+        documents = []
+        for text in texts:
+            articleWithoutSpecialCaracters = unidecode(text)
+            document = re.sub('[^A-Za-z .\-]+', ' ', articleWithoutSpecialCaracters)
+            documents.append(' '.join(document.split()))
+
+        return [[w.text for w in doc if ((w.pos_ == "NOUN" or w.pos_ == "PROPN") and len(w.text) > 1)]
+                for doc in nlp.pipe(documents, batch_size=settings.NLP_BATCH_SIZE)]
+
+    def compute_scores(self, progress: Optional[Progress] = None) -> 'WebPage':
         logger.debug("Start compute_scores")
         # Extract the title and the text of the article
-        g = Goose({
-            'browser_user_agent': "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.14; rv:64.0) Gecko/20100101 Firefox/64.0"
-        })
         try:
-            article = g.extract(url=self.url)
-        except InvalidSchema:
-            self.delete()
-            raise APIException.warning("Adresse invalide")
-        except RequestException:
-            self.delete()
-            raise APIException.warning("Le site n'est pas joignable")
+            with metrics.timer('extraction'):
+                article = extract_article(self.url)
+        except (InvalidSchema, RequestException) as e:
+            raise self._extraction_failed(e)
 
         # article_counter = Counter(self.tokens(article.cleaned_text))
 
-        logger.debug("Text of the article : %s", article.cleaned_text)
-        if article.cleaned_text == "":
-            self.delete()
-            raise APIException.warning("Oups, nous n'avons pas pu extraire le texte de l'article.")
-
-        nouns_article = self.nouns(article.cleaned_text)
-        counter_nouns_article = Counter(self.tokens(nouns_article))
-        logger.debug("Nouns in the article : %s", counter_nouns_article)
+        self._check_article(article)
+        report(progress, 'extraction', title=article.title)
 
-        related_articles = get_related_articles(article, 7)
+        with metrics.timer('search'):
+            if settings.BING_SINGLE_QUERY:
+                # One search over 30 days, the 7 days window is filtered from it
+                wide_related_articles = get_related_articles(article, 30)
+                related_articles = narrow_related_articles(wide_related_articles, article, 7)
+            else:
+                related_articles = get_related_articles(article, 7)
 
-        only_same_publisher = self.check_same_publisher(related_articles)
-
-        if not related_articles.get("value") or only_same_publisher is True:
+        if not self._has_related_articles(related_articles):
             logger.debug("No article found, try with a period of 30 days before publishing.")
-            related_articles = get_related_articles(article, 30)
+            if settings.BING_SINGLE_QUERY:
+                related_articles = wide_related_articles
+            else:
+                with metrics.timer('search'):
+                    related_articles = get_related_articles(article, 30)
 
-            only_same_publisher = self.check_same_publisher(related_articles)
-            if not related_articles.get("value") or only_same_publisher is True:
-                isolated, created = IsolatedArticle.objects.get_or_create(url=self.url, base_domain=self.base_domain)
-                self.delete()
-                raise APIException.info("Cet article semble isolé, nous n'avons trouvé aucun article en lien avec lui. "
-                                        "Faites attention!")
+            if not self._has_related_articles(related_articles):
+                raise self._isolated()
 
         logger.debug("Articles found %s", related_articles)
+        report(progress, 'search', related_articles=len(related_articles['value']))
 
-        counter_article = 0
-        for word in counter_nouns_article:
-            if counter_nouns_article[word] > 1:
-                counter_article += 1
-        logger.debug("Number of interesting nouns : %s", counter_article)
+        self._compute_content_score(related_articles, article, progress=progress)
+        return self._finish_scores()
 
-        if counter_article > 2:
-            self._compute_content_score(counter_nouns_article, related_articles, counter_article, article)
-        else:
-            self.delete()
-            raise APIException.warning("Notre méthode de calcul n'a pas pu fournir de résultat sur cet article.")
+    def _extraction_failed(self, exception: Exception) -> APIException:
+        if isinstance(exception, InvalidSchema):
+            return APIException.warning("Adresse invalide")
+        return APIException.warning("Le site n'est pas joignable")
 
+    def _check_article(self, article: goose3.article.Article) -> None:
+        logger.debug("Text of the article : %s", article.cleaned_text)
+        if article.cleaned_text == "":
+            raise APIException.warning("Oups, nous n'avons pas pu extraire le texte de l'article.")
+
+    def _has_related_articles(self, related_articles: dict) -> bool:
+        return bool(related_articles.get("value")) and not self.check_same_publisher(related_articles)
+
+    def _isolated(self) -> APIException:
+        IsolatedArticle.objects.get_or_create(url=self.url, base_domain=self.base_domain)
+        return APIException.info("Cet article semble isolé, nous n'avons trouvé aucun article en lien avec lui. "
+                                 "Faites attention!")
+
+    def _finish_scores(self) -> 'WebPage':
         self.scores_version = WebPage.CURRENT_SCORES_VERSION
-        self.save()
+        self.lease_expires_at = None
+        with metrics.timer('storage'):
+            self.save()
         logger.info(f"Finished computing scores for article {self.url}")
         return self
 
@@ -232,56 +654,139 @@ class WebPage(models.Model):
 
         return only_same_publisher
 
-    def _compute_content_score(self, counter_nouns_article: Counter, related_articles: dict,
-                               counter_article: int, article: goose3.article.Article) -> None:
+    def linked_urls(self, related_articles: dict) -> List[str]:
+        """
+        :return: The urls of the related articles found, except the ones of the publisher of the page
+        """
+        parsed_uri = urlparse(self.url)
+        linked_urls = []
+        for link in related_articles['value']:
+            linked_url = link['url']
+            logger.debug("Found URL: %s", linked_url)
+            if parsed_uri.netloc not in linked_url:
+                linked_urls.append(linked_url)
+        return linked_urls
+
+    def _compute_content_score(self, related_articles: dict, article: goose3.article.Article,
+                               linked_articles: Optional[List[Tuple[str, Union['ExtractedArticle', Exception]]]] = None,
+                               progress: Optional[Progress] = None) -> None:
+        """
+        :param linked_articles: The related articles already extracted, see extract_related_articles
+        """
+        if linked_articles is None:
+            with metrics.timer('related_articles'):
+                linked_articles = extract_related_articles(self.linked_urls(related_articles))
+        self._store_content_score(self._analyze_content(article, linked_articles, progress), progress)
+
+    def _analyze_content(self, article: goose3.article.Article,
+                         linked_articles: List[Tuple[str, Union['ExtractedArticle', Exception]]],
+                         progress: Optional[Progress] = None) -> 'ContentAnalysis':
+        """
+        Filter the related articles and tag all the articles, without any database query.
+        """
+        analysis = ContentAnalysis()
+        with metrics.timer('similarity'):
+            article_signature = similarity.signature(article.cleaned_text)
+            for linked_url, linked_article in linked_articles:
+                if isinstance(linked_article, (ValueError, LookupError, RequestException)):
+                    logger.error(f"Found page that can't be processed : {linked_url} "
+                                 f"with error message {linked_article}")
+                    metrics.increment('related_articles', result='failed')
+                    report(progress, 'related_article', url=linked_url, status='failed')
+                    continue
+                elif isinstance(linked_article, Exception):
+                    raise linked_article
+                logger.debug("Name of the article: %s", linked_article.title)
+
+                if linked_article.is_blocked:
+                    logger.debug("Article 'You have been blocked' not considered")
+                    analysis.blocked_counter += 1
+                    metrics.increment('related_articles', result='blocked')
+                    report(progress, 'related_article', url=linked_url, status='skipped', reason='blocked')
+                    continue
+
+                analysis.extracted_articles.append(linked_article)
+                if similarity.similarity(article_signature,
+                                         linked_article.signature) > settings.NEAR_DUPLICATE_THRESHOLD:
+                    logger.debug("Article with content too similar not considered")
+                    analysis.too_similar_counter += 1
+                    metrics.increment('related_articles', result='too_similar')
+                    report(progress, 'related_article', url=linked_url, status='skipped', reason='too_similar')
+                else:
+                    analysis.candidate_articles.append((linked_url, linked_article))
+                    metrics.increment('related_articles', result='fetched')
+                    report(progress, 'related_article', url=linked_url, status='fetched', title=linked_article.title)
+
+        # Tag the article and the related articles which are not cached yet in one batch
+        with metrics.timer('nlp'):
+            articles_to_tag = list(OrderedDict(
+                (id(linked_article), linked_article) for _, linked_article in analysis.candidate_articles
+                if linked_article.stems is None
+            ).values())
+            nouns = self.nouns_batch([article.cleaned_text] + [a.cleaned_text for a in articles_to_tag])
+            analysis.counter_nouns_article = Counter(self.tokens(nouns[0]))
+            logger.debug("Nouns in the article : %s", analysis.counter_nouns_article)
+            for linked_article, linked_nouns in zip(articles_to_tag, nouns[1:]):
+                linked_article.stems_counter = Counter(self.tokens(linked_nouns))
+        return analysis
+
+    def _store_content_score(self, analysis: 'ContentAnalysis', progress: Optional[Progress] = None) -> None:
+        """
+        Score the content from the analysis of the articles and store the articles and the fingerprints.
+        """
+        with metrics.timer('storage'):
+            ExtractedArticle.store(analysis.extracted_articles)
+
+        related_fingerprints = [
+            ScoredRelatedArticle(url=linked_url, title=linked_article.title, stems=linked_article.stems)
+            for linked_url, linked_article in analysis.candidate_articles
+        ]
+        with metrics.timer('scoring'):
+            self._score_content(analysis.counter_nouns_article, related_fingerprints, analysis.blocked_counter,
+                                analysis.too_similar_counter, progress)
+        self.stems = dump_counter(analysis.counter_nouns_article)
+        with metrics.timer('storage'):
+            self._store_related_fingerprints(related_fingerprints)
+
+    def _score_content(self, counter_nouns_article: Counter, related_fingerprints: List['ScoredRelatedArticle'],
+                       blocked_counter: int = 0, too_similar_counter: int = 0,
+                       progress: Optional[Progress] = None) -> None:
+        """
+        Compute the content score from the stems of the article and of its related articles only,
+        so that it can be computed again from the stored fingerprints.
+        """
         nb_articles = 0
         interesting_articles = 0
         scores_new_articles = []
         dict_interesting_articles = {}
-        parsed_uri = urlparse(self.url)
-        logger.debug("URL parsed")
-        g = Goose({
-            'browser_user_agent': "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.14; rv:64.0) Gecko/20100101 Firefox/64.0"
-        })
-        blocked_counter = 0
-        too_similar_counter = 0
 
-        # Look for similar articles' url
-        for link in related_articles['value']:
-            linked_url = link['url']
-            logger.debug("Found URL: %s", linked_url)
+        counter_article = 0
+        for word in counter_nouns_article:
+            if counter_nouns_article[word] > 1:
+                counter_article += 1
+        logger.debug("Number of interesting nouns : %s", counter_article)
 
-            if parsed_uri.netloc not in linked_url:
-                try:
-                    linked_article = g.extract(url=linked_url)
-                    logger.debug("Name of the article: %s", linked_article.title)
-
-                    if "You have been blocked" in linked_article.title:
-                        logger.debug("Article 'You have been blocked' not considered")
-                        blocked_counter += 1
-                    elif SequenceMatcher(None, article.cleaned_text, linked_article.cleaned_text).ratio() > 0.3:
-                        logger.debug("Article with content too similar not considered")
-                        too_similar_counter += 1
-                    else:
-                        new_nouns_article = self.nouns(linked_article.cleaned_text)
-                        new_counter_nouns_articles = Counter(self.tokens(new_nouns_article))
-                        shared_items = [k for k in counter_nouns_article if
-                                        k in new_counter_nouns_articles and counter_nouns_article[k] > 1]
-                        score_article = len(shared_items) / counter_article
-                        if score_article > 0.4:
-                            scores_new_articles.append(score_article)
-                            interesting_articles += 1
-                            dict_interesting_articles[linked_url] = (linked_article.title, score_article)
-                        else:
-                            logger.debug("Too low score : %s", score_article)
-                        nb_articles += 1
-                        logger.debug("Percentage for new articles : %s", scores_new_articles)
-                except (ValueError, LookupError, RequestException) as e:
-                    logger.error(f"Found page that can't be processed : {linked_url} with error message {e}")
+        if counter_article <= 2:
+            raise APIException.warning("Notre méthode de calcul n'a pas pu fournir de résultat sur cet article.")
+
+        for related_fingerprint in related_fingerprints:
+            new_counter_nouns_articles = related_fingerprint.stems_counter
+            shared_items = [k for k in counter_nouns_article if
+                            k in new_counter_nouns_articles and counter_nouns_article[k] > 1]
+            score_article = len(shared_items) / counter_article
+            if score_article > 0.4:
+                scores_new_articles.append(score_article)
+                interesting_articles += 1
+                dict_interesting_articles[related_fingerprint.url] = (related_fingerprint.title, score_article)
+            else:
+                logger.debug("Too low score : %s", score_article)
+            report(progress, 'related_article', url=related_fingerprint.url, status='scored',
+                   score=int(score_article * 100))
+            nb_articles += 1
+            logger.debug("Percentage for new articles : %s", scores_new_articles)
 
         # Calcul du score de l'article
         if nb_articles == 0:
-            self.delete()
             message = ("Nous n'avons trouvé que des articles trop similaires au vôtre. "
                        "Il se peut qu'ils proviennent tous de la même source.")
             if blocked_counter > too_similar_counter:
@@ -298,37 +803,76 @@ class WebPage(models.Model):
         self.total_articles = nb_articles
         self._store_interesting_related_articles(dict_interesting_articles)
 
-    def _store_interesting_related_articles(self, dict_interesting_articles: dict) -> None:
-        InterestingRelatedArticle.objects.filter(web_page=self).delete()
-        tld_extract = tldextract.TLDExtract(
-            cache_file='api/external_data/public_suffixes_list.dat',
-            include_psl_private_domains=True
-        )
-        for url, (title, score) in dict_interesting_articles.items():
-            score = int(score * 100)
-            base_domain, created = BaseDomain.objects.get_or_create(base_domain=extract_base_domain(url, tld_extract))
-            InterestingRelatedArticle.objects.create(
-                title=title, url=url, score=score,
-                web_page=self, base_domain=base_domain
+    def _store_related_fingerprints(self, related_fingerprints: List['ScoredRelatedArticle']) -> None:
+        ScoredRelatedArticle.objects.filter(web_page=self).delete()
+        for related_fingerprint in related_fingerprints:
+            related_fingerprint.web_page = self
+        ScoredRelatedArticle.objects.bulk_create(related_fingerprints)
+
+    @property
+    def has_fingerprints(self) -> bool:
+        return self.stems is not None
+
+    def rescore_from_fingerprints(self) -> 'WebPage':
+        """
+        Compute the scores again from the stored stems, without downloading, searching or tagging anything.
+        The page keeps its date, its scores being as old as the search results they come from.
+        """
+        with transaction.atomic():
+            self._score_content(load_counter(self.stems), list(self.scored_related_articles.all()))
+            self.scores_version = WebPage.CURRENT_SCORES_VERSION
+            WebPage.objects.filter(pk=self.pk).update(
+                content_score=self.content_score,
+                total_articles=self.total_articles,
+                scores_version=self.scores_version,
             )
+            # Done by api.signals when the page is saved
+            score = self.aggregable_score
+            BaseDomain.update_aggregates(self.base_domain_id, removed_score=self._aggregated_score, added_score=score)
+            self._aggregated_score = score
+        page_cache.invalidate(self.url)
+        logger.info(f"Finished computing scores from fingerprints for article {self.url}")
+        return self
 
-    def to_dict(self) -> dict:
-        fields_to_serialize = [
-            'url', 'global_score', 'total_articles',
-            'site_score_articles_count', 'interesting_related_articles_count'
-        ]
-        self_serialized = {field: getattr(self, field) for field in fields_to_serialize}
+    def _store_interesting_related_articles(self, dict_interesting_articles: dict) -> None:
+        domain_names = {url: extract_base_domain(url) for url in dict_interesting_articles}
+        with transaction.atomic():
+            InterestingRelatedArticle.objects.filter(web_page=self).delete()
+            base_domains = BaseDomain.get_or_create_many(domain_names.values())
+            InterestingRelatedArticle.objects.bulk_create([
+                InterestingRelatedArticle(
+                    title=title, url=url, score=int(score * 100),
+                    web_page=self, base_domain=base_domains[domain_names[url]]
+                )
+                for url, (title, score) in dict_interesting_articles.items()
+            ])
 
-        scores = ['content_score', 'site_score', 'isolated_articles_score']
-        self_serialized['scores'] = {field: getattr(self, field) for field in scores}
+    def to_dict(self) -> dict:
+        """
+        Serialize the page with at most 2 queries: one for its domain if it wasn't selected with the page
+        and one for its interesting related articles, unless they were prefetched.
+        """
+        site_score = self.site_score
+        isolated_articles_score = self.isolated_articles_score
+        related_articles = sorted(self.interesting_related_articles.all(), key=lambda article: -article.score)
+
+        self_serialized = {
+            'url': self.url,
+            'global_score': self._global_score(site_score, isolated_articles_score),
+            'total_articles': self.total_articles,
+            'site_score_articles_count': self.base_domain.scores_count,
+            'interesting_related_articles_count': len(related_articles),
+            'stale': not self.is_fresh,
+        }
+        self_serialized['scores'] = {
+            'content_score': self.content_score,
+            'site_score': site_score,
+            'isolated_articles_score': isolated_articles_score,
+        }
 
         self_serialized['related_articles_selection'] = []
-        tld_extract = tldextract.TLDExtract(
-            cache_file='api/external_data/public_suffixes_list.dat',
-            include_psl_private_domains=True
-        )
-        for article in self.interesting_related_articles.order_by('-score')[:3]:
-            base_domain = extract_base_domain(article.url, tld_extract)
+        for article in related_articles[:3]:
+            base_domain = extract_base_domain(article.url)
             self_serialized['related_articles_selection'].append({
                 'title': article.title,
                 'url': article.url,
@@ -337,37 +881,227 @@ class WebPage(models.Model):
 
         return self_serialized
 
-    @classmethod
-    def from_url(cls, url: str) -> 'WebPage':
-        existing = cls.objects.filter(url=url).first()
+    @staticmethod
+    def fresh_filter() -> models.Q:
+        """
+        :return: The filter of the pages which are fresh, see is_fresh
+        """
+        return (models.Q(scores_version=WebPage.CURRENT_SCORES_VERSION)
+                & models.Q(updated_at__gt=timezone.now() - datetime.timedelta(days=settings.SCORES_SOFT_MAX_AGE))
+                & ~models.Q(content_score=None))
+
+    @property
+    def is_fresh(self) -> bool:
+        return (self.content_score is not None
+                and self.scores_version == WebPage.CURRENT_SCORES_VERSION
+                and self.updated_at > timezone.now() - datetime.timedelta(days=settings.SCORES_SOFT_MAX_AGE))
 
-        if existing and existing.content_score is None:
-            raise APIException.info('Cet article est en cours de traitement. Merci de réessayer dans quelques minutes.')
+    @property
+    def is_stale(self) -> bool:
+        """
+        Scores which are not fresh anymore but can still be returned while they are computed again.
+        """
+        return (self.content_score is not None
+                and not self.is_fresh
+                and self.updated_at > timezone.now() - datetime.timedelta(days=settings.SCORES_HARD_MAX_AGE))
+
+    def _serve_stale(self) -> 'WebPage':
+        logger.info(f"Returning stale object for url {self.url}")
+        stats.increment('stale_served')
+        if not self.is_being_computed:
+            schedule_refresh(self.url)
+        return self
 
-        if (existing
-                and existing.scores_version == WebPage.CURRENT_SCORES_VERSION
-                and existing.updated_at > timezone.now() - datetime.timedelta(days=7)):
-            logger.info(f"Returning existing object for url {url}")
+    @classmethod
+    def get_fresh(cls, url: str, allow_stale: bool = False) -> Optional['WebPage']:
+        existing = cls.objects.select_related('base_domain').filter(url=url).first()
+        if existing and existing.is_fresh:
             return existing
+        if allow_stale and existing and existing.is_stale:
+            return existing._serve_stale()
+        return None
 
-        elif not existing:
-            base_domain = extract_base_domain(url)
-            logger.debug(f"Base domain found {base_domain}")
-            domain, created = BaseDomain.objects.get_or_create(base_domain=base_domain)
-            existing = cls.objects.create(
-                url=url,
-                scores_version=WebPage.CURRENT_SCORES_VERSION,
-                base_domain=domain,
-                total_articles=0
-            )
+    @classmethod
+    def get_fresh_many(cls, urls: Iterable[str], allow_stale: bool = False) -> Dict[str, 'WebPage']:
+        """
+        Same as get_fresh for several urls, with 2 queries which also load what to_dict needs.
+        """
+        web_pages = {}
+        for existing in (cls.objects
+                         .select_related('base_domain')
+                         .prefetch_related('interesting_related_articles')
+                         .filter(url__in=list(urls))):
+            if existing.is_fresh:
+                web_pages[existing.url] = existing
+            elif allow_stale and existing.is_stale:
+                web_pages[existing.url] = existing._serve_stale()
+        return web_pages
+
+    @property
+    def is_being_computed(self) -> bool:
+        now = timezone.now()
+        if self.lease_expires_at is not None:
+            return self.lease_expires_at > now
+        # Page created without lease, by a previous version
+        return (self.content_score is None
+                and self.updated_at > now - datetime.timedelta(seconds=settings.SCORING_LEASE_DURATION))
+
+    def acquire_lease(self) -> bool:
+        """
+        Take the right to compute the scores of the page, unless another computation holds it.
+        """
+        now = timezone.now()
+        expires_at = now + datetime.timedelta(seconds=settings.SCORING_LEASE_DURATION)
+        acquired = (WebPage.objects
+                    .filter(pk=self.pk)
+                    .filter(models.Q(lease_expires_at=None) | models.Q(lease_expires_at__lte=now))
+                    .update(lease_expires_at=expires_at))
+        if acquired:
+            self.lease_expires_at = expires_at
+        return bool(acquired)
+
+    def release_lease(self) -> None:
+        """
+        Let another request compute the scores, the page being removed if it was created for the computation.
+        """
+        if self.content_score is None:
+            self.delete()
+        else:
+            WebPage.objects.filter(pk=self.pk).update(lease_expires_at=None)
+            self.lease_expires_at = None
+
+    def _failed(self, exception: Exception, keep_stale: bool = False) -> APIException:
+        """
+        Record the failure of the computation for the requests waiting for it, then remove the page,
+        or only its lease if its previous scores are kept.
+        :return: The error to send
+        """
+        if not isinstance(exception, APIException):
+            exception = APIException.error("Erreur lors du calcul du score.", internal_message=str(exception))
+        # Before the page is deleted, a waiting request would compute it again otherwise
+        page_cache.store_failure(self.url, exception)
+        if keep_stale and (WebPage.objects
+                           .filter(pk=self.pk, content_score__isnull=False)
+                           .update(lease_expires_at=None)):
+            self.lease_expires_at = None
+        else:
+            self.delete()
+        return exception
 
+    def admit(self) -> Optional[int]:
+        """
+        Wait for a computation slot, see api.admission, giving up the lease if there is none.
+        """
         try:
-            return existing.compute_scores()
-        except APIException as e:
-            raise e
+            return admission.acquire()
+        except OverloadedException:
+            self.release_lease()
+            raise
+
+    @classmethod
+    def _create_for_computation(cls, url: str) -> Optional['WebPage']:
+        base_domain = extract_base_domain(url)
+        logger.debug(f"Base domain found {base_domain}")
+        domain, created = BaseDomain.objects.get_or_create(base_domain=base_domain)
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    url=url,
+                    scores_version=WebPage.CURRENT_SCORES_VERSION,
+                    base_domain=domain,
+                    total_articles=0,
+                    lease_expires_at=timezone.now() + datetime.timedelta(seconds=settings.SCORING_LEASE_DURATION),
+                )
+        except IntegrityError:
+            # Created by a concurrent request
+            return None
+
+    def _compute_with_lease(self, progress: Optional[Progress] = None, keep_stale: bool = False) -> 'WebPage':
+        computation = _Computation()
+        with _computations_lock:
+            _computations[self.url] = computation
+        try:
+            with _LeaseHeartbeat(self), metrics.scoring():
+                return self.compute_scores(progress)
         except Exception as e:
-            existing.delete()
-            raise APIException.error("Erreur lors du calcul du score.", internal_message=str(e))
+            computation.exception = self._failed(e, keep_stale)
+            raise computation.exception
+        finally:
+            with _computations_lock:
+                _computations.pop(self.url, None)
+            computation.done.set()
+
+    @classmethod
+    def _lookup_for_computation(cls, url: str, allow_stale: bool, force: bool = False,
+                                waited: bool = False) -> Tuple[Optional['WebPage'], bool]:
+        """
+        :param force: Compute the scores even if they are fresh
+        :param waited: The request waited for a computation of the scores
+        :return: The page and False if it can be returned as it is, the page and True if its scores must be computed,
+        its lease being acquired, or None and False if another request is computing them.
+        :raise APIException: If the computation waited for failed, maybe in another process
+        """
+        if waited:
+            failure = page_cache.lookup_failure(url)
+            if failure is not None:
+                raise failure
+
+        while True:
+            existing = cls.objects.select_related('base_domain').filter(url=url).first()
+
+            if not force and existing and existing.is_fresh:
+                logger.info(f"Returning existing object for url {url}")
+                metrics.increment('page_lookups', result='fresh')
+                return existing, False
+
+            if not force and allow_stale and existing and existing.is_stale:
+                metrics.increment('page_lookups', result='stale')
+                return existing._serve_stale(), False
+
+            if existing and existing.is_being_computed:
+                return None, False
+
+            if not existing:
+                existing = cls._create_for_computation(url)
+                if existing is None:
+                    continue
+            elif not existing.acquire_lease():
+                continue
+
+            # A previous failure must not be returned to the requests waiting for this computation
+            page_cache.forget_failure(url)
+            metrics.increment('page_lookups', result='compute')
+            return existing, True
+
+    @classmethod
+    def from_url(cls, url: str, allow_stale: bool = False, progress: Optional[Progress] = None,
+                 force: bool = False, keep_stale: bool = False) -> 'WebPage':
+        """
+        Concurrent calls for the same url wait for the computation in progress, at most settings.SINGLE_FLIGHT_WAIT
+        seconds, instead of starting another one. Computations whose lease expired are taken over.
+
+        :param allow_stale: Return stale scores right away and compute them again in the background
+        :param progress: Told about each step of the computation
+        :param force: Compute the scores again even if they are fresh, unless another computation of them ends meanwhile
+        :param keep_stale: Keep the previous scores of the page if the computation fails, instead of deleting it
+        """
+        deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT
+        waiting = False
+        while True:
+            web_page, must_compute = cls._lookup_for_computation(url, allow_stale, force and not waiting, waiting)
+            if must_compute:
+                node_slot = web_page.admit()
+                try:
+                    return web_page._compute_with_lease(progress, keep_stale)
+                finally:
+                    admission.release(node_slot)
+            if web_page is not None:
+                return web_page
+            if not waiting:
+                waiting = True
+                metrics.increment('page_lookups', result='computing')
+                report(progress, 'waiting')
+            _wait_for_computation(url, remaining_wait(deadline))
 
     def __str__(self):
         return self.url
@@ -381,8 +1115,316 @@ class InterestingRelatedArticle(models.Model):
     base_domain = models.ForeignKey(BaseDomain, on_delete=models.PROTECT, related_name='interesting_related_articles')
 
 
+class ScoredRelatedArticle(models.Model):
+    """
+    Fingerprint of a related article taken into account in the content score of a page.
+    """
+    url = models.URLField(max_length=500)
+    title = models.CharField(max_length=500)
+    stems = models.TextField()
+    web_page = models.ForeignKey(WebPage, on_delete=models.CASCADE, related_name='scored_related_articles')
+
+    @property
+    def stems_counter(self) -> Counter:
+        return load_counter(self.stems)
+
+
 class IsolatedArticle(models.Model):
     url = models.URLField(max_length=500, unique=True)
     base_domain = models.ForeignKey(BaseDomain, on_delete=models.PROTECT, related_name='isolated_articles')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+
+class ExtractedArticle(models.Model):
+    """
+    Related articles extracted by Goose, with the stems of their nouns once computed.
+    Stored in the database so every worker benefits from the extractions made by the others.
+    """
+    url = models.URLField(unique=True, max_length=500)
+    title = models.CharField(max_length=500)
+    cleaned_text = models.TextField()
+    stems = models.TextField(blank=True, null=True)
+    minhash = models.TextField(blank=True, null=True)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._changed_fields = set()
+
+    @property
+    def is_blocked(self) -> bool:
+        return "You have been blocked" in self.title
+
+    @property
+    def stems_counter(self) -> Optional[Counter]:
+        if self.stems is None:
+            return None
+        return load_counter(self.stems)
+
+    @stems_counter.setter
+    def stems_counter(self, counter: Counter) -> None:
+        self.stems = dump_counter(counter)
+        self._changed_fields.add('stems')
+
+    @property
+    def signature(self) -> List[int]:
+        if self.minhash is None:
+            self.minhash = json.dumps(similarity.signature(self.cleaned_text), separators=(',', ':'))
+            self._changed_fields.add('minhash')
+        return json.loads(self.minhash)
+
+    @classmethod
+    def from_article(cls, url: str, article: goose3.article.Article) -> 'ExtractedArticle':
+        return cls(url=canonical_url(url), title=(article.title or '')[:500], cleaned_text=article.cleaned_text or '')
+
+    @classmethod
+    def _expiration_limit(cls) -> datetime.datetime:
+        return timezone.now() - datetime.timedelta(hours=settings.EXTRACTED_ARTICLES_CACHE_TTL)
+
+    @classmethod
+    def lookup(cls, urls: Iterable[str]) -> Dict[str, 'ExtractedArticle']:
+        """
+        :return: The fresh cached articles, by url
+        """
+        keys = {url: canonical_url(url) for url in urls}
+        found = {article.url: article for article in
+                 cls.objects.filter(url__in=set(keys.values()), created_at__gte=cls._expiration_limit())}
+        # The usage is only recorded once per resolution window, most hits then need no write
+        now = timezone.now()
+        touched = [article.pk for article in found.values() if
+                   article.used_at < now - datetime.timedelta(minutes=settings.EXTRACTED_ARTICLES_USED_AT_RESOLUTION)]
+        if touched:
+            cls.objects.filter(pk__in=touched).update(hits=F('hits') + 1, used_at=now)
+        stats.increment('extracted_articles_cache.hits', len(found))
+        stats.increment('extracted_articles_cache.misses', len(set(keys.values())) - len(found))
+        return {url: found[key] for url, key in keys.items() if key in found}
+
+    @classmethod
+    def store(cls, articles: Iterable['ExtractedArticle']) -> None:
+        """
+        Insert the new articles in the cache and save the stems and signatures computed for the cached ones.
+        """
+        new_articles = OrderedDict()
+        for article in articles:
+            if article.pk is None:
+                if len(article.url) <= cls._meta.get_field('url').max_length:
+                    new_articles.setdefault(article.url, article)
+            elif article._changed_fields:
+                cls.objects.filter(pk=article.pk).update(
+                    **{field: getattr(article, field) for field in article._changed_fields}
+                )
+                article._changed_fields.clear()
+
+        if not new_articles:
+            return
+
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create(new_articles.values())
+        except IntegrityError:
+            # Another worker cached some of these articles in the meantime, or they expired and await the eviction
+            now = timezone.now()
+            for article in new_articles.values():
+                try:
+                    with transaction.atomic():
+                        article.save()
+                except IntegrityError:
+                    cls.objects.filter(url=article.url, created_at__lt=cls._expiration_limit()).update(
+                        title=article.title, cleaned_text=article.cleaned_text, stems=article.stems,
+                        minhash=article.minhash, hits=0, created_at=now, used_at=now,
+                    )
+
+    @classmethod
+    def evict(cls) -> int:
+        """
+        Delete the expired articles, then the least recently used ones above settings.EXTRACTED_ARTICLES_CACHE_SIZE.
+        Run periodically by `article_cache_stats --evict`, never while scoring.
+        """
+        deleted, _ = cls.objects.filter(created_at__lt=cls._expiration_limit()).delete()
+        size = settings.EXTRACTED_ARTICLES_CACHE_SIZE
+        overflow = list(cls.objects.order_by('-used_at').values_list('used_at', flat=True)[size:size + 1])
+        if overflow:
+            overflow_deleted, _ = cls.objects.filter(used_at__lte=overflow[0]).delete()
+            deleted += overflow_deleted
+        return deleted
+
+    @classmethod
+    def cache_stats(cls) -> dict:
+        process_stats = stats.snapshot()
+        return {
+            'entries': cls.objects.count(),
+            'expired_entries': cls.objects.filter(created_at__lt=cls._expiration_limit()).count(),
+            'total_hits': cls.objects.aggregate(total_hits=models.Sum('hits'))['total_hits'] or 0,
+            'process_hits': process_stats.get('extracted_articles_cache.hits', 0),
+            'process_misses': process_stats.get('extracted_articles_cache.misses', 0),
+        }
+
+    def __str__(self):
+        return self.url
+
+
+class SearchResult(models.Model):
+    """
+    Responses of the Bing API, kept settings.SEARCH_RESULTS_CACHE_TTL hours to avoid paying twice for the same search.
+    """
+    key = models.CharField(max_length=40, unique=True)
+    endpoint = models.URLField()
+    query = models.CharField(max_length=500)
+    since = models.FloatField(blank=True, null=True)
+    response = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    @staticmethod
+    def make_key(endpoint: str, params: dict) -> str:
+        return hashlib.sha1(json.dumps([endpoint, params], sort_keys=True).encode()).hexdigest()
+
+    @classmethod
+    def _expiration_limit(cls) -> datetime.datetime:
+        return timezone.now() - datetime.timedelta(hours=settings.SEARCH_RESULTS_CACHE_TTL)
+
+    @classmethod
+    def lookup(cls, endpoint: str, params: dict) -> Optional[dict]:
+        cached = (cls.objects
+                  .filter(key=cls.make_key(endpoint, params), created_at__gte=cls._expiration_limit())
+                  .values_list('response', flat=True)
+                  .first())
+        if cached is None:
+            stats.increment('search_results_cache.misses')
+            return None
+        stats.increment('search_results_cache.hits')
+        return json.loads(cached)
+
+    @classmethod
+    def store(cls, endpoint: str, params: dict, response: dict) -> None:
+        cls.objects.filter(created_at__lt=cls._expiration_limit()).delete()
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    key=cls.make_key(endpoint, params),
+                    endpoint=endpoint,
+                    query=params.get('q', '')[:500],
+                    since=params.get('since'),
+                    response=json.dumps(response),
+                )
+        except IntegrityError:
+            # Another worker made the same search in the meantime
+            pass
+
+    def __str__(self):
+        return f"{self.query} ({self.endpoint})"
+
+
+class JobStatus(ChoiceEnum):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class ScoringJob(models.Model):
+    """
+    Scoring of a page requested through the API and computed later by the score_worker command.
+    """
+    url = models.URLField(max_length=500, db_index=True)
+    status = models.CharField(max_length=10, choices=JobStatus.choices(), default=JobStatus.PENDING.name)
+    web_page = models.ForeignKey(WebPage, on_delete=models.SET_NULL, blank=True, null=True, related_name='jobs')
+    # Level and message of the APIException raised if the scoring failed
+    level = models.PositiveIntegerField(blank=True, null=True)
+    message = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    # Not claimed before this time, set when the job is put back in the queue
+    not_before = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (JobStatus.DONE.name, JobStatus.FAILED.name)
+
+    @classmethod
+    def enqueue(cls, url: str) -> 'ScoringJob':
+        """
+        :return: The unfinished job for this url if there is one, a new job otherwise
+        """
+        job = (cls.objects
+               .filter(url=url, status__in=[JobStatus.PENDING.name, JobStatus.RUNNING.name])
+               .order_by('created_at')
+               .first())
+        if job is None:
+            job = cls.objects.create(url=url)
+            logger.info(f"Enqueued scoring of {url}")
+        return job
+
+    @classmethod
+    def claim(cls) -> Optional['ScoringJob']:
+        """
+        Take the oldest pending job whose backoff is over, or a running one whose worker seems to have died,
+        and mark it as running.
+        The jobs already attempted settings.SCORING_JOB_MAX_ATTEMPTS times are marked as failed instead.
+        """
+        now = timezone.now()
+        stale_limit = now - datetime.timedelta(seconds=settings.SCORING_JOB_TIMEOUT)
+        while True:
+            with transaction.atomic():
+                job = (cls.objects
+                       .select_for_update(skip_locked=True)
+                       .filter((models.Q(status=JobStatus.PENDING.name)
+                                & (models.Q(not_before=None) | models.Q(not_before__lte=now)))
+                               | models.Q(status=JobStatus.RUNNING.name, started_at__lt=stale_limit))
+                       .order_by('created_at')
+                       .first())
+                if job is None:
+                    return None
+                if job.attempts >= settings.SCORING_JOB_MAX_ATTEMPTS:
+                    logger.error(f"Scoring of {job.url} given up after {job.attempts} attempts")
+                    job.status = JobStatus.FAILED.name
+                    job.level = logging.ERROR
+                    job.message = "Erreur lors du calcul du score."
+                    job.finished_at = timezone.now()
+                    job.save()
+                    continue
+                job.status = JobStatus.RUNNING.name
+                job.started_at = timezone.now()
+                job.attempts += 1
+                job.save()
+            return job
+
+    def run(self) -> None:
+        try:
+            # The refreshes of stale pages are jobs too
+            self.web_page = WebPage.from_url(self.url, keep_stale=True)
+            self.status = JobStatus.DONE.name
+        except OverloadedException as e:
+            # Taken again by a worker once the load had time to decrease
+            logger.warning(f"No computation slot for {self.url}, job put back in the queue")
+            self.status = JobStatus.PENDING.name
+            self.started_at = None
+            self.not_before = timezone.now() + datetime.timedelta(seconds=e.retry_after)
+            # Not an attempt to score the page
+            self.attempts -= 1
+            self.save()
+            return
+        except APIException as e:
+            self.status = JobStatus.FAILED.name
+            self.level = e.level
+            self.message = e.message
+            message = ' - '.join(filter(None, [e.message, e.internal_message, self.url]))
+            logger.log(e.level, message, exc_info=e.level >= logging.ERROR)
+        self.finished_at = timezone.now()
+        self.save()
+
+    @classmethod
+    def purge(cls) -> int:
+        """
+        Delete the jobs finished for more than settings.SCORING_JOBS_RETENTION hours.
+        """
+        limit = timezone.now() - datetime.timedelta(hours=settings.SCORING_JOBS_RETENTION)
+        deleted, _ = cls.objects.filter(finished_at__lt=limit).delete()
+        return deleted
+
+    def __str__(self):
+        return f"{self.url} ({self.status})"
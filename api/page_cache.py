@@ -0,0 +1,72 @@
+"""
+Serialized responses of the scored pages, so that the requests for a page already scored
+don't need the database.
+"""
+import hashlib
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from api import stats
+from api.exceptions import APIException
+
+
+def _key(url: str) -> str:
+    return 'page:' + hashlib.sha1(url.encode()).hexdigest()
+
+
+def _failure_key(url: str) -> str:
+    return 'failure:' + hashlib.sha1(url.encode()).hexdigest()
+
+
+def etag(web_page) -> str:
+    """
+    Strong ETag of the response for a page: it changes with its scores and with the aggregates of its domain.
+    """
+    domain = web_page.base_domain
+    domain.ensure_aggregates()
+    version = ':'.join(str(value) for value in (
+        web_page.pk, web_page.scores_version, web_page.updated_at.isoformat(),
+        domain.scores_sum, domain.scores_count, domain.web_pages_count, domain.isolated_count,
+    ))
+    return '"{}"'.format(hashlib.sha1(version.encode()).hexdigest())
+
+
+def lookup(url: str) -> Optional[Tuple[str, str]]:
+    """
+    :return: The ETag and the JSON response for the url, if cached
+    """
+    cached = cache.get(_key(url))
+    stats.increment('page_cache_hits' if cached is not None else 'page_cache_misses')
+    return cached
+
+
+def store(url: str, etag_value: str, content: str) -> None:
+    cache.set(_key(url), (etag_value, content), settings.PAGE_CACHE_TIMEOUT)
+
+
+def invalidate(url: str) -> None:
+    """
+    Forget the response for the url once the current transaction is committed: before, a concurrent request
+    could still read the previous version of the page and cache it again.
+    """
+    key = _key(url)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def store_failure(url: str, exception: APIException) -> None:
+    """
+    Keep the error of a failed computation for the requests of every process waiting for it.
+    """
+    cache.set(_failure_key(url), (exception.level, exception.message), settings.COMPUTATION_FAILURE_TIMEOUT)
+
+
+def lookup_failure(url: str) -> Optional[APIException]:
+    failure = cache.get(_failure_key(url))
+    return APIException(*failure) if failure is not None else None
+
+
+def forget_failure(url: str) -> None:
+    cache.delete(_failure_key(url))
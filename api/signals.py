@@ -0,0 +1,46 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api import page_cache
+from api.models import BaseDomain, IsolatedArticle, WebPage
+
+
+def _refresh_cached_domain(instance) -> None:
+    # The aggregates were updated in the database, not on the domain loaded with the instance
+    if type(instance).base_domain.is_cached(instance):
+        instance.base_domain.refresh_from_db()
+
+
+@receiver(post_save, sender=WebPage)
+def add_web_page_to_aggregates(sender, instance: WebPage, created: bool, **kwargs):
+    score = instance.aggregable_score
+    BaseDomain.update_aggregates(
+        instance.base_domain_id,
+        web_pages=1 if created else 0,
+        removed_score=instance._aggregated_score,
+        added_score=score,
+    )
+    instance._aggregated_score = score
+    _refresh_cached_domain(instance)
+    page_cache.invalidate(instance.url)
+
+
+@receiver(post_delete, sender=WebPage)
+def remove_web_page_from_aggregates(sender, instance: WebPage, **kwargs):
+    BaseDomain.update_aggregates(instance.base_domain_id, web_pages=-1, removed_score=instance._aggregated_score)
+    instance._aggregated_score = None
+    _refresh_cached_domain(instance)
+    page_cache.invalidate(instance.url)
+
+
+@receiver(post_save, sender=IsolatedArticle)
+def add_isolated_article_to_aggregates(sender, instance: IsolatedArticle, created: bool, **kwargs):
+    if created:
+        BaseDomain.update_aggregates(instance.base_domain_id, isolated=1)
+        _refresh_cached_domain(instance)
+
+
+@receiver(post_delete, sender=IsolatedArticle)
+def remove_isolated_article_from_aggregates(sender, instance: IsolatedArticle, **kwargs):
+    BaseDomain.update_aggregates(instance.base_domain_id, isolated=-1)
+    _refresh_cached_domain(instance)
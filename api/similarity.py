@@ -0,0 +1,51 @@
+"""
+Near-duplicate detection between articles, with bottom-k MinHash signatures of their word shingles.
+
+The signature of a text, the SIGNATURE_SIZE smallest hashes of its shingles, is computed once in linear time
+and two signatures are compared in constant time. The proportion of the smallest hashes of both signatures
+shared by the two texts estimates the Jaccard similarity of their shingles.
+Signatures are stored with the extracted articles: changing the parameters below invalidates them.
+"""
+import heapq
+import re
+import zlib
+from difflib import SequenceMatcher
+from typing import List, Set
+
+SHINGLE_SIZE = 3
+SIGNATURE_SIZE = 128
+# Ratio above which the texts were considered as copies when they were compared with difflib
+SEQUENCE_MATCHER_THRESHOLD = 0.3
+
+_MASK = (1 << 64) - 1
+
+
+def shingles(text: str) -> Set[int]:
+    words = re.findall(r'\w+', text.lower())
+    size = min(SHINGLE_SIZE, len(words))
+    # crc32 is fast but poorly distributed, the multiplication spreads its values over 64 bits
+    return {(zlib.crc32(' '.join(words[i:i + size]).encode()) * 0x9E3779B97F4A7C15) & _MASK
+            for i in range(len(words) - size + 1) if size}
+
+
+def signature(text: str) -> List[int]:
+    return sorted(heapq.nsmallest(SIGNATURE_SIZE, shingles(text)))
+
+
+def similarity(signature1: List[int], signature2: List[int]) -> float:
+    """
+    :return: The estimated Jaccard similarity of the texts, 0 if one of them is empty
+    """
+    if not signature1 or not signature2:
+        return 0.0
+    hashes1, hashes2 = set(signature1), set(signature2)
+    smallest = heapq.nsmallest(SIGNATURE_SIZE, hashes1 | hashes2)
+    return sum(1 for value in smallest if value in hashes1 and value in hashes2) / len(smallest)
+
+
+def sequence_ratio(text1: str, text2: str) -> float:
+    """
+    :return: The difflib ratio the threshold of the estimates is calibrated against. Without autojunk, which made
+    all the letters junk in the texts of more than 200 characters, so that only verbatim copies were detected.
+    """
+    return SequenceMatcher(None, text1, text2, autojunk=False).ratio()
@@ -0,0 +1,20 @@
+import threading
+from collections import Counter
+
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def increment(name: str, value: int = 1) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def get(name: str) -> int:
+    with _lock:
+        return _counters[name]
+
+
+def snapshot() -> dict:
+    with _lock:
+        return dict(_counters)
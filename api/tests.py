@@ -1,7 +1,41 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.client import HTTPMessage
+from io import StringIO
+from unittest import mock
 
-from api.exceptions import APIException
-from api.models import WebPage, BaseDomain
+import requests
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from requests import RequestException
+from requests.cookies import extract_cookies_to_jar
+
+from api import admission, async_client, async_scoring, health, http_client, metrics, page_cache, similarity, views
+from api.exceptions import APIException, OverloadedException
+from api.models import (BaseDomain, ExtractedArticle, InterestingRelatedArticle, IsolatedArticle, JobStatus,
+                        ScoredRelatedArticle, ScoringJob, WebPage, _refresh, base_domains_cache_stats, bing_search,
+                        extract_article, extract_base_domain, extract_related_articles, fetch_related_articles,
+                        get_tld_extract, narrow_related_articles, stems_cache_stats)
+from api.utils import RateLimiter
+
+
+def setUpModule():
+    # The file based cache outlives the runs of the tests
+    cache.clear()
 
 
 class WebPageTestCase(TestCase):
@@ -74,6 +108,17 @@ class WebPageTestCase(TestCase):
         self.assertEqual(self.page.interesting_related_articles.first().title, interesting_title)
         self.assertEqual(self.page.interesting_related_articles.first().score, expected_score)
 
+    def test_store_interesting_related_articles_constant_queries(self):
+        with CaptureQueriesContext(connection) as one_article:
+            self.page._store_interesting_related_articles({'https://toto.com/a': ("A", 0.5)})
+        with CaptureQueriesContext(connection) as ten_articles:
+            self.page._store_interesting_related_articles({
+                f'https://toto{i}.com/article': (f"Article {i}", 0.5) for i in range(10)
+            })
+        self.assertEqual(len(one_article), len(ten_articles))
+        self.assertEqual(self.page.interesting_related_articles.count(), 10)
+        self.assertEqual(BaseDomain.objects.filter(base_domain__startswith='toto').count(), 11)
+
     def test_to_dict_url(self):
         result = self.page.to_dict()
         self.assertIn('url', result)
@@ -132,6 +177,7 @@ class WebPageTestCase(TestCase):
         with self.assertRaisesRegex(APIException, "Adresse invalide"):
             WebPage.from_url(url)
 
+    @override_settings(SINGLE_FLIGHT_WAIT=0)
     def test_asking_for_article_being_processed_raises_exception(self):
         domain, created = BaseDomain.objects.get_or_create(base_domain="example.com")
         article = WebPage.objects.create(
@@ -142,3 +188,1416 @@ class WebPageTestCase(TestCase):
         )
         with self.assertRaisesRegex(APIException, "en cours de traitement"):
             WebPage.from_url(article.url)
+
+
+class FetchRelatedArticlesTestCase(TestCase):
+    @staticmethod
+    def fake_extract(url):
+        if 'error' in url:
+            raise RequestException("unreachable")
+        if 'slow' in url:
+            time.sleep(0.5)
+        return mock.Mock(title=url)
+
+    def test_results_keep_urls_order(self):
+        urls = [f'https://example{i}.com/article' for i in range(10)]
+        with mock.patch('api.models.extract_article', side_effect=self.fake_extract):
+            results = fetch_related_articles(urls)
+        self.assertEqual([url for url, _ in results], urls)
+        self.assertEqual([article.title for _, article in results], urls)
+
+    def test_failed_extraction_returns_exception(self):
+        urls = ['https://example.com/error', 'https://example.com/article']
+        with mock.patch('api.models.extract_article', side_effect=self.fake_extract):
+            results = fetch_related_articles(urls)
+        self.assertIsInstance(results[0][1], RequestException)
+        self.assertEqual(results[1][1].title, urls[1])
+
+    @override_settings(RELATED_ARTICLE_TIMEOUT=0.1)
+    def test_slow_extraction_times_out(self):
+        urls = ['https://example.com/slow', 'https://example.com/article']
+        with mock.patch('api.models.extract_article', side_effect=self.fake_extract):
+            results = fetch_related_articles(urls)
+        self.assertIsInstance(results[0][1], RequestException)
+        self.assertEqual(results[1][1].title, urls[1])
+
+
+class ExtractedArticleTestCase(TestCase):
+    def setUp(self):
+        self.cached = ExtractedArticle.objects.create(
+            url='https://toto.com/article', title="Cached article", cleaned_text="Du texte", stems='{"text":2}'
+        )
+
+    def test_lookup_uses_canonical_url(self):
+        ExtractedArticle.objects.filter(pk=self.cached.pk).update(used_at=timezone.now() - datetime.timedelta(hours=2))
+        found = ExtractedArticle.lookup(['https://TOTO.com/article?utm_source=bing#top'])
+        self.assertEqual(found['https://TOTO.com/article?utm_source=bing#top'].pk, self.cached.pk)
+        self.cached.refresh_from_db()
+        self.assertEqual(self.cached.hits, 1)
+
+    def test_lookup_ignores_expired_articles(self):
+        expired_at = timezone.now() - datetime.timedelta(days=30)
+        ExtractedArticle.objects.filter(pk=self.cached.pk).update(created_at=expired_at)
+        self.assertEqual(ExtractedArticle.lookup([self.cached.url]), {})
+
+    def test_extract_related_articles_only_fetches_missing_articles(self):
+        other_url = 'https://other.com/article'
+        fetched = mock.Mock(title="Fetched article", cleaned_text="Autre texte")
+        with mock.patch('api.models.fetch_related_articles', return_value=[(other_url, fetched)]) as fetch:
+            results = extract_related_articles([self.cached.url, other_url])
+        fetch.assert_called_once_with([other_url])
+        self.assertEqual(results[0][1].pk, self.cached.pk)
+        self.assertEqual(results[1][1].title, "Fetched article")
+        self.assertIsNone(results[1][1].pk)
+
+    def test_store_saves_new_articles_and_stems(self):
+        new = ExtractedArticle(url='https://other.com/article', title="New", cleaned_text="Texte")
+        new.stems_counter = Counter({'text': 1})
+        self.cached.stems_counter = Counter({'text': 3})
+        ExtractedArticle.store([new, self.cached])
+        self.assertEqual(ExtractedArticle.objects.get(url=new.url).stems_counter, Counter({'text': 1}))
+        self.assertEqual(ExtractedArticle.objects.get(pk=self.cached.pk).stems_counter, Counter({'text': 3}))
+
+    def test_store_overwrites_expired_articles(self):
+        ExtractedArticle.objects.filter(pk=self.cached.pk).update(created_at=timezone.now() - datetime.timedelta(days=30),
+                                                                  hits=5)
+        new = ExtractedArticle(url=self.cached.url, title="New", cleaned_text="Nouveau texte")
+        new.stems_counter = Counter({'nouveau': 1})
+        ExtractedArticle.store([new])
+        found = ExtractedArticle.lookup([self.cached.url])[self.cached.url]
+        self.assertEqual((found.pk, found.title, found.hits), (self.cached.pk, "New", 0))
+        self.assertEqual(found.stems_counter, Counter({'nouveau': 1}))
+
+    def test_recent_usage_is_not_written_again(self):
+        with self.assertNumQueries(1):
+            ExtractedArticle.lookup([self.cached.url])
+        self.cached.refresh_from_db()
+        self.assertEqual(self.cached.hits, 0)
+
+    @override_settings(EXTRACTED_ARTICLES_CACHE_SIZE=1)
+    def test_evict_least_recently_used(self):
+        ExtractedArticle.objects.filter(pk=self.cached.pk).update(used_at=timezone.now() - datetime.timedelta(hours=1))
+        ExtractedArticle.store([ExtractedArticle(url='https://other.com/article', title="New", cleaned_text="")])
+        self.assertEqual(ExtractedArticle.objects.count(), 2)
+        self.assertEqual(ExtractedArticle.evict(), 1)
+        self.assertEqual(list(ExtractedArticle.objects.values_list('url', flat=True)), ['https://other.com/article'])
+
+
+class SearchTestCase(TestCase):
+    def test_bing_search_is_cached(self):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {'value': [{'url': 'https://toto.com/article'}]}
+        with mock.patch('api.models.http_client.get', return_value=response) as get:
+            first = bing_search('https://bing.test/search', {'q': "Titre"})
+            second = bing_search('https://bing.test/search', {'q': "Titre"})
+        get.assert_called_once()
+        self.assertEqual(first, second)
+
+    def test_bing_search_errors_are_not_cached(self):
+        with mock.patch('api.models.http_client.get', return_value=mock.Mock(status_code=500)) as get:
+            self.assertEqual(bing_search('https://bing.test/search', {'q': "Titre"}), {'value': []})
+            bing_search('https://bing.test/search', {'q': "Titre"})
+        self.assertEqual(get.call_count, 2)
+
+    def test_narrow_related_articles(self):
+        article = mock.Mock(publish_datetime_utc=datetime.datetime(2019, 1, 20, tzinfo=datetime.timezone.utc))
+        related_articles = {'value': [
+            {'url': 'https://toto.com/recent', 'datePublished': '2019-01-15T10:00:00.0000000Z'},
+            {'url': 'https://toto.com/old', 'datePublished': '2019-01-02T10:00:00.0000000Z'},
+            {'url': 'https://toto.com/undated'},
+            {'url': 'https://toto.com/unreadable', 'datePublished': '15/01/2019'},
+        ]}
+        narrowed = narrow_related_articles(related_articles, article, 7)
+        self.assertEqual([a['url'] for a in narrowed['value']],
+                         ['https://toto.com/recent', 'https://toto.com/undated', 'https://toto.com/unreadable'])
+
+
+class HttpClientTestCase(TestCase):
+    def test_session_is_shared(self):
+        self.assertIs(http_client.get_session(), http_client.get_session())
+
+    @override_settings(HTTP_CONNECT_TIMEOUT=1, HTTP_READ_TIMEOUT=2)
+    def test_get_sets_default_timeouts(self):
+        with mock.patch.object(http_client.get_session(), 'get') as get:
+            http_client.get('https://example.com')
+        get.assert_called_once_with('https://example.com', timeout=(1, 2))
+
+    def test_cookies_are_not_kept(self):
+        session = http_client.get_session()
+        request = requests.Request('GET', 'https://example.com/article').prepare()
+        headers = HTTPMessage()
+        headers['Set-Cookie'] = 'session=1; Path=/'
+        extract_cookies_to_jar(session.cookies, request, mock.Mock(_original_response=mock.Mock(msg=headers)))
+        self.assertEqual(len(session.cookies), 0)
+
+    def test_extract_article_parses_downloaded_page(self):
+        html = b"<html><head><title>Titre de l'article</title></head><body><p>Texte</p></body></html>"
+        with mock.patch('api.models.http_client.get', return_value=mock.Mock(content=html)):
+            article = extract_article('https://example.com/article')
+        self.assertEqual(article.title, "Titre de l'article")
+
+    def test_extract_article_raises_on_http_error(self):
+        response = mock.Mock()
+        response.raise_for_status.side_effect = RequestException("404")
+        with mock.patch('api.models.http_client.get', return_value=response):
+            with self.assertRaises(RequestException):
+                extract_article('https://example.com/article')
+
+
+class NounsTestCase(TestCase):
+    @staticmethod
+    def fake_pipe(documents, **kwargs):
+        for document in documents:
+            yield [mock.Mock(text=word, pos_="NOUN" if word.istitle() else "VERB") for word in document.split()]
+
+    def test_nouns_batch_tags_all_texts_at_once(self):
+        with mock.patch('api.models.nlp', create=True) as nlp:
+            nlp.pipe.side_effect = self.fake_pipe
+            nouns = WebPage.nouns_batch(["Le Président mange", "Une Pomme  verte !", "L été"])
+        nlp.pipe.assert_called_once()
+        self.assertEqual(nouns, [["Le", "President"], ["Une", "Pomme"], []])
+
+
+class StemsTestCase(TestCase):
+    def test_tokens_stems_every_word(self):
+        self.assertEqual(WebPage.tokens(["présidents", "président", "présidents"]),
+                         ["président", "président", "président"])
+
+    def test_stems_are_cached(self):
+        WebPage.tokens(["gouvernements"])
+        hits = stems_cache_stats()['hits']
+        WebPage.tokens(["gouvernements"])
+        self.assertEqual(stems_cache_stats()['hits'], hits + 1)
+
+
+class SimilarityTestCase(TestCase):
+    text = ("Le président de la République a annoncé mardi une réforme des retraites "
+            "qui sera présentée au conseil des ministres la semaine prochaine. "
+            "Les syndicats ont appelé à une journée de mobilisation dans toute la France.")
+
+    def test_identical_texts(self):
+        self.assertEqual(similarity.similarity(similarity.signature(self.text), similarity.signature(self.text)), 1.0)
+
+    def test_different_texts(self):
+        other = "La recette de la tarte aux pommes demande du beurre, de la farine et beaucoup de patience."
+        self.assertLess(similarity.similarity(similarity.signature(self.text), similarity.signature(other)), 0.1)
+
+    def test_empty_text(self):
+        self.assertEqual(similarity.similarity(similarity.signature(self.text), similarity.signature("")), 0.0)
+
+    def test_partial_copies_agree_with_sequence_matcher(self):
+        rand = random.Random(0)
+        vocabulary = [''.join(rand.choice('abcdefghijlmnoprstuv') for _ in range(rand.randint(2, 9)))
+                      for _ in range(800)]
+
+        def words(count):
+            return [rand.choice(vocabulary) for _ in range(count)]
+
+        source = words(450)
+        for copied in (0, 225, 300):
+            # A page copying a part of the source, completed with text of its own
+            start = rand.randint(0, len(source) - copied)
+            text, copy = ' '.join(source), ' '.join(source[start:start + copied] + words(len(source) - copied))
+            too_similar = similarity.sequence_ratio(text, copy) > similarity.SEQUENCE_MATCHER_THRESHOLD
+            estimate = similarity.similarity(similarity.signature(text), similarity.signature(copy))
+            self.assertEqual(estimate > settings.NEAR_DUPLICATE_THRESHOLD, too_similar, copied)
+
+    def test_signature_is_cached_with_the_article(self):
+        article = ExtractedArticle.objects.create(url='https://toto.com/article', title="Titre", cleaned_text=self.text)
+        signature = article.signature
+        ExtractedArticle.store([article])
+        self.assertEqual(ExtractedArticle.objects.get(pk=article.pk).signature, signature)
+
+
+class FingerprintsTestCase(TestCase):
+    def setUp(self):
+        domain, created = BaseDomain.objects.get_or_create(base_domain="example.com")
+        self.page = WebPage.objects.create(
+            url="https://example.com/article",
+            content_score=50,
+            base_domain=domain,
+            scores_version=WebPage.CURRENT_SCORES_VERSION - 1,
+            total_articles=5,
+            stems='{"president":3,"reform":2,"retrait":2,"syndicat":1}',
+        )
+        ScoredRelatedArticle.objects.create(
+            web_page=self.page, url='https://toto.com/a', title="A", stems='{"president":1,"reform":1,"retrait":4}'
+        )
+        ScoredRelatedArticle.objects.create(
+            web_page=self.page, url='https://toto.com/b', title="B", stems='{"cuisin":2}'
+        )
+
+    def test_rescore_from_fingerprints(self):
+        updated_at = timezone.now() - datetime.timedelta(days=5)
+        WebPage.objects.filter(pk=self.page.pk).update(updated_at=updated_at)
+        self.page.base_domain.rebuild_aggregates()
+        self.page.rescore_from_fingerprints()
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.updated_at, updated_at)
+        self.assertEqual(self.page.scores_version, WebPage.CURRENT_SCORES_VERSION)
+        self.assertEqual(self.page.total_articles, 2)
+        # Half of the articles are interesting, with a score of 1 * 1.5 capped to 100
+        self.assertEqual(self.page.content_score, 75)
+        self.assertEqual(list(self.page.interesting_related_articles.values_list('url', flat=True)),
+                         ['https://toto.com/a'])
+        self.page.base_domain.refresh_from_db()
+        self.assertEqual((self.page.base_domain.scores_count, self.page.base_domain.scores_sum), (1, 75))
+
+    def test_rescore_from_fingerprints_without_enough_nouns(self):
+        self.page.stems = '{"president":3}'
+        with self.assertRaisesRegex(APIException, "n'a pas pu fournir de résultat"):
+            self.page.rescore_from_fingerprints()
+        # The previous scores are kept
+        self.assertTrue(WebPage.objects.filter(pk=self.page.pk).exists())
+
+    def test_only_valid_fingerprints_are_rescored(self):
+        call_command('rescore_from_fingerprints', stdout=StringIO())
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.scores_version, WebPage.CURRENT_SCORES_VERSION - 1)
+
+        with mock.patch.object(WebPage, 'FINGERPRINTS_VALID_VERSIONS', (WebPage.CURRENT_SCORES_VERSION - 1,)):
+            call_command('rescore_from_fingerprints', stdout=StringIO())
+        self.page.refresh_from_db()
+        self.assertEqual(self.page.scores_version, WebPage.CURRENT_SCORES_VERSION)
+
+
+class DomainAggregatesTestCase(TestCase):
+    def setUp(self):
+        self.domain = BaseDomain.objects.create(base_domain="example.com")
+        self.domain.rebuild_aggregates()
+        self.page = WebPage.objects.create(
+            url="https://example.com/article",
+            content_score=50,
+            base_domain=self.domain,
+            scores_version=WebPage.CURRENT_SCORES_VERSION,
+            total_articles=5
+        )
+        WebPage.objects.create(
+            url="https://example.com/article2",
+            content_score=21.5,
+            base_domain=self.domain,
+            scores_version=WebPage.CURRENT_SCORES_VERSION,
+            total_articles=5
+        )
+        WebPage.objects.create(
+            url="https://example.com/old",
+            content_score=100,
+            base_domain=self.domain,
+            scores_version=WebPage.CURRENT_SCORES_VERSION - 1,
+            total_articles=5
+        )
+
+    def assertAggregatesUpToDate(self):
+        self.domain.refresh_from_db()
+        aggregates = (self.domain.scores_sum, self.domain.scores_count,
+                      self.domain.web_pages_count, self.domain.isolated_count)
+        self.domain.rebuild_aggregates()
+        self.assertEqual(aggregates, (self.domain.scores_sum, self.domain.scores_count,
+                                      self.domain.web_pages_count, self.domain.isolated_count))
+
+    def test_aggregates_on_create(self):
+        self.assertAggregatesUpToDate()
+        self.assertEqual(self.domain.site_score, 35.5)
+        self.assertEqual(self.page.site_score_articles_count, 2)
+
+    def test_aggregates_on_score_update(self):
+        page = WebPage.objects.get(url="https://example.com/old")
+        page.content_score = 60
+        page.scores_version = WebPage.CURRENT_SCORES_VERSION
+        page.save()
+        self.assertAggregatesUpToDate()
+        self.assertEqual(self.domain.scores_count, 3)
+
+    def test_aggregates_on_delete(self):
+        WebPage.objects.filter(url__startswith="https://example.com/article").delete()
+        self.assertAggregatesUpToDate()
+        self.assertEqual(self.domain.web_pages_count, 1)
+
+    def test_aggregates_on_isolated_articles(self):
+        IsolatedArticle.objects.get_or_create(url="https://example.com/isolated", base_domain=self.domain)
+        self.assertAggregatesUpToDate()
+        self.assertEqual(self.domain.isolated_articles_ratio, 1 / 4)
+        IsolatedArticle.objects.all().delete()
+        self.assertAggregatesUpToDate()
+
+    def test_outdated_aggregates_are_rebuilt(self):
+        BaseDomain.objects.filter(pk=self.domain.pk).update(aggregates_version=0, scores_count=0)
+        self.domain.refresh_from_db()
+        self.assertEqual(self.domain.site_score, 35.5)
+
+    def test_counters_never_go_below_zero(self):
+        # Counters of a domain created before the aggregates were added
+        BaseDomain.objects.filter(pk=self.domain.pk).update(web_pages_count=0, scores_count=0, scores_sum=0)
+        self.page.delete()
+        self.domain.refresh_from_db()
+        self.assertEqual((self.domain.web_pages_count, self.domain.scores_count, self.domain.scores_sum), (0, 0, 0))
+        self.assertIsNone(self.domain.site_score)
+
+
+class SerializationQueriesTestCase(TestCase):
+    def setUp(self):
+        domain = BaseDomain.objects.create(base_domain="example.com")
+        domain.rebuild_aggregates()
+        self.page = WebPage.objects.create(
+            url="https://example.com/article",
+            content_score=50,
+            base_domain=domain,
+            scores_version=WebPage.CURRENT_SCORES_VERSION,
+            total_articles=5
+        )
+        self.page._store_interesting_related_articles({
+            f'https://toto{i}.com/article': (f"Article {i}", i / 10) for i in range(5)
+        })
+
+    def test_to_dict_queries(self):
+        page = WebPage.objects.select_related('base_domain').get(pk=self.page.pk)
+        with self.assertNumQueries(1):
+            result = page.to_dict()
+        self.assertEqual(result['interesting_related_articles_count'], 5)
+        self.assertEqual([article['title'] for article in result['related_articles_selection']],
+                         ["Article 4", "Article 3", "Article 2"])
+
+    def test_to_dict_queries_without_select_related(self):
+        page = WebPage.objects.get(pk=self.page.pk)
+        with self.assertNumQueries(2):
+            page.to_dict()
+
+    def test_to_dict_queries_with_prefetch(self):
+        page = (WebPage.objects
+                .select_related('base_domain')
+                .prefetch_related('interesting_related_articles')
+                .get(pk=self.page.pk))
+        with self.assertNumQueries(0):
+            page.to_dict()
+
+    def test_to_dict_values(self):
+        result = self.page.to_dict()
+        self.assertEqual(result['global_score'], self.page.global_score)
+        self.assertEqual(result['site_score_articles_count'], self.page.site_score_articles_count)
+        self.assertEqual(result['interesting_related_articles_count'], self.page.interesting_related_articles_count)
+
+
+class BaseDomainExtractionTestCase(TestCase):
+    def test_extractor_is_shared(self):
+        self.assertIs(get_tld_extract(), get_tld_extract())
+
+    def test_extract_base_domain(self):
+        self.assertEqual(extract_base_domain('https://www.Example.com/article?id=1'), 'example.com')
+        self.assertEqual(extract_base_domain('http://user@news.example.com:8080/a'), 'example.com')
+        self.assertEqual(extract_base_domain('example.com/article'), 'example.com')
+
+    def test_same_result_as_extractor(self):
+        for url in ['https://www.example.com/article', 'about:debugging', 'https://toto.com']:
+            self.assertEqual(extract_base_domain(url), extract_base_domain(url, get_tld_extract()))
+
+    def test_base_domains_are_cached(self):
+        extract_base_domain('https://www.example.org/article')
+        hits = base_domains_cache_stats()['hits']
+        extract_base_domain('https://www.example.org/other-article')
+        self.assertEqual(base_domains_cache_stats()['hits'], hits + 1)
+
+
+class ScoringJobTestCase(TestCase):
+    def setUp(self):
+        self.domain = BaseDomain.objects.create(base_domain="example.com")
+        self.page = WebPage.objects.create(
+            url="https://example.com/article",
+            content_score=50,
+            base_domain=self.domain,
+            scores_version=WebPage.CURRENT_SCORES_VERSION,
+            total_articles=5
+        )
+
+    def test_fresh_page_is_returned_in_async_mode(self):
+        response = self.client.get('/api/page', {'url': self.page.url, 'async': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertFalse(ScoringJob.objects.exists())
+
+    def test_unknown_page_is_enqueued_in_async_mode(self):
+        response = self.client.get('/api/page', {'url': 'https://example.com/new', 'async': 'true'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'pending')
+        job = ScoringJob.objects.get()
+        self.assertEqual(response.json()['data']['job_id'], job.pk)
+
+        response = self.client.get('/api/page', {'url': 'https://example.com/new', 'async': 'true'})
+        self.assertEqual(response.json()['data']['job_id'], job.pk)
+
+    def test_claim_and_run(self):
+        job = ScoringJob.enqueue(self.page.url)
+        claimed = ScoringJob.claim()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, JobStatus.RUNNING.name)
+        self.assertIsNone(ScoringJob.claim())
+
+        claimed.run()
+        response = self.client.get('/api/job', {'id': job.pk})
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertEqual(response.json()['data']['url'], self.page.url)
+
+    def test_failed_job(self):
+        job = ScoringJob.enqueue('https://example.com/new')
+        with mock.patch('api.models.WebPage.from_url', side_effect=APIException.warning("Adresse invalide")):
+            ScoringJob.claim().run()
+        response = self.client.get('/api/job', {'id': job.pk})
+        self.assertEqual(response.json(), {'status': 'warning', 'data': {'message': "Adresse invalide"}})
+
+    @override_settings(SCORING_JOB_TIMEOUT=60)
+    def test_stale_running_job_is_claimed_again(self):
+        job = ScoringJob.enqueue(self.page.url)
+        ScoringJob.claim()
+        ScoringJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - datetime.timedelta(minutes=5))
+        claimed = ScoringJob.claim()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.attempts, 2)
+
+    @override_settings(SCORING_JOB_TIMEOUT=60, SCORING_JOB_MAX_ATTEMPTS=2)
+    def test_job_is_given_up_after_max_attempts(self):
+        job = ScoringJob.enqueue(self.page.url)
+        ScoringJob.objects.filter(pk=job.pk).update(
+            status=JobStatus.RUNNING.name, attempts=2, started_at=timezone.now() - datetime.timedelta(minutes=5)
+        )
+        other_job = ScoringJob.enqueue('https://example.com/new')
+        self.assertEqual(ScoringJob.claim().pk, other_job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED.name)
+        self.assertEqual(self.client.get('/api/job', {'id': job.pk}).json()['status'], 'error')
+
+    def test_overloaded_job_is_not_an_attempt(self):
+        ScoringJob.enqueue(self.page.url)
+        with mock.patch('api.models.WebPage.from_url', side_effect=OverloadedException(30)):
+            ScoringJob.claim().run()
+        self.assertEqual(ScoringJob.objects.get().attempts, 0)
+
+    def test_overloaded_job_is_claimed_after_a_backoff(self):
+        ScoringJob.enqueue(self.page.url)
+        with mock.patch('api.models.WebPage.from_url', side_effect=OverloadedException(30)):
+            ScoringJob.claim().run()
+        self.assertIsNone(ScoringJob.claim())
+        ScoringJob.objects.update(not_before=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(ScoringJob.claim().status, JobStatus.RUNNING.name)
+
+    @override_settings(SCORING_WORKER_POLL_INTERVAL=0)
+    def test_worker_survives_database_errors(self):
+        ScoringJob.enqueue(self.page.url)
+        claims = [OperationalError("database is restarting"), ScoringJob.claim(), None]
+        out = StringIO()
+        with mock.patch.object(ScoringJob, 'claim', side_effect=claims), mock.patch.object(ScoringJob, 'run'), \
+                mock.patch('api.management.commands.score_worker.connection'), \
+                self.assertLogs('api.management.commands.score_worker', 'ERROR'):
+            call_command('score_worker', concurrency=1, once=True, stdout=out)
+        self.assertIn("Successfully processed 1 jobs", out.getvalue())
+
+    def test_done_job_of_deleted_page(self):
+        job = ScoringJob.enqueue(self.page.url)
+        ScoringJob.claim().run()
+        self.page.delete()
+        response = self.client.get('/api/job', {'id': job.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'info')
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get('/api/job', {'id': 404}).status_code, 404)
+        self.assertEqual(self.client.get('/api/job').status_code, 400)
+
+
+class SingleFlightTestCase(TestCase):
+    def setUp(self):
+        self.domain = BaseDomain.objects.create(base_domain="example.com")
+
+    @staticmethod
+    def fake_compute_scores(web_page, progress=None):
+        web_page.content_score = 42
+        web_page.lease_expires_at = None
+        web_page.save()
+        return web_page
+
+    def test_new_page_is_created_with_lease(self):
+        with mock.patch.object(WebPage, 'compute_scores', autospec=True,
+                               side_effect=lambda page, progress=None: self.assertTrue(page.is_being_computed) or page):
+            WebPage.from_url("https://example.com/new")
+
+    def test_stale_page_without_lease_is_taken_over(self):
+        page = WebPage.objects.create(
+            url="https://example.com/stale", base_domain=self.domain,
+            scores_version=WebPage.CURRENT_SCORES_VERSION, total_articles=0
+        )
+        WebPage.objects.filter(pk=page.pk).update(updated_at=timezone.now() - datetime.timedelta(hours=1))
+        with mock.patch.object(WebPage, 'compute_scores', autospec=True, side_effect=self.fake_compute_scores):
+            self.assertEqual(WebPage.from_url(page.url).content_score, 42)
+
+    def test_expired_lease_is_taken_over(self):
+        page = WebPage.objects.create(
+            url="https://example.com/expired", base_domain=self.domain,
+            scores_version=WebPage.CURRENT_SCORES_VERSION, total_articles=0,
+            lease_expires_at=timezone.now() - datetime.timedelta(seconds=1)
+        )
+        with mock.patch.object(WebPage, 'compute_scores', autospec=True, side_effect=self.fake_compute_scores):
+            self.assertEqual(WebPage.from_url(page.url).content_score, 42)
+
+    def test_lease_is_acquired_once(self):
+        page = WebPage.objects.create(
+            url="https://example.com/old", base_domain=self.domain, content_score=10,
+            scores_version=WebPage.CURRENT_SCORES_VERSION - 1, total_articles=0
+        )
+        self.assertTrue(page.acquire_lease())
+        self.assertFalse(WebPage.objects.get(pk=page.pk).acquire_lease())
+
+    @override_settings(SINGLE_FLIGHT_WAIT=0.2, SINGLE_FLIGHT_POLL_INTERVAL=0.05)
+    def test_valid_lease_makes_callers_wait(self):
+        page = WebPage.objects.create(
+            url="https://example.com/computing", base_domain=self.domain,
+            scores_version=WebPage.CURRENT_SCORES_VERSION, total_articles=0,
+            lease_expires_at=timezone.now() + datetime.timedelta(minutes=1)
+        )
+        start = time.monotonic()
+        with mock.patch.object(WebPage, 'compute_scores') as compute_scores:
+            with self.assertRaisesRegex(APIException, "en cours de traitement"):
+                WebPage.from_url(page.url)
+        compute_scores.assert_not_called()
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_failure_in_another_process_is_returned_to_waiters(self):
+        cache.clear()
+        page = WebPage.objects.create(
+            url="https://example.com/failing", base_domain=self.domain,
+            scores_version=WebPage.CURRENT_SCORES_VERSION, total_articles=0,
+            lease_expires_at=timezone.now() + datetime.timedelta(minutes=1)
+        )
+
+        def fail_elsewhere(seconds):
+            page_cache.store_failure(page.url, APIException.warning("Le site n'est pas joignable"))
+            page.delete()
+
+        with mock.patch('api.models.time.sleep', side_effect=fail_elsewhere), \
+                mock.patch.object(WebPage, 'compute_scores') as compute_scores:
+            with self.assertRaisesRegex(APIException, "pas joignable"):
+                WebPage.from_url(page.url)
+        compute_scores.assert_not_called()
+        self.assertFalse(WebPage.objects.filter(url=page.url).exists())
+
+    def test_failure_is_recorded_and_forgotten_by_the_next_computation(self):
+        cache.clear()
+        url = "https://example.com/retried"
+        with mock.patch.object(WebPage, 'compute_scores', side_effect=ValueError("Boom")):
+            with self.assertRaises(APIException):
+                WebPage.from_url(url)
+        self.assertEqual(page_cache.lookup_failure(url).message, "Erreur lors du calcul du score.")
+        with mock.patch.object(WebPage, 'compute_scores', autospec=True, side_effect=self.fake_compute_scores):
+            self.assertEqual(WebPage.from_url(url).content_score, 42)
+        self.assertIsNone(page_cache.lookup_failure(url))
+
+
+class StaleWhileRevalidateTestCase(TestCase):
+    def setUp(self):
+        self.domain = BaseDomain.objects.create(base_domain="example.com")
+
+    def create_page(self, url, age_days, scores_version=WebPage.CURRENT_SCORES_VERSION):
+        page = WebPage.objects.create(
+            url=url, base_domain=self.domain, content_score=40,
+            scores_version=scores_version, total_articles=10
+        )
+        WebPage.objects.filter(pk=page.pk).update(updated_at=timezone.now() - datetime.timedelta(days=age_days))
+        return page
+
+    @override_settings(SCORES_SOFT_MAX_AGE=7, SCORES_HARD_MAX_AGE=30)
+    def test_stale_page_is_returned_and_refreshed(self):
+        page = self.create_page("https://example.com/stale", 10)
+        with mock.patch('api.models.schedule_refresh') as schedule_refresh, \
+                mock.patch.object(WebPage, 'compute_scores') as compute_scores:
+            web_page = WebPage.from_url(page.url, allow_stale=True)
+        compute_scores.assert_not_called()
+        schedule_refresh.assert_called_once_with(page.url)
+        self.assertEqual(web_page.pk, page.pk)
+        self.assertTrue(web_page.to_dict()['stale'])
+
+    def test_previous_version_is_stale(self):
+        page = self.create_page("https://example.com/old-version", 1, WebPage.CURRENT_SCORES_VERSION - 1)
+        with mock.patch('api.models.schedule_refresh') as schedule_refresh:
+            web_page = WebPage.get_fresh(page.url, allow_stale=True)
+        schedule_refresh.assert_called_once_with(page.url)
+        # No page of the domain has scores of the current version
+        self.assertEqual(web_page.to_dict()['scores']['site_score'], 40)
+
+    def test_stale_page_being_computed_is_not_refreshed_again(self):
+        page = self.create_page("https://example.com/refreshing", 10)
+        page.acquire_lease()
+        with mock.patch('api.models.schedule_refresh') as schedule_refresh:
+            WebPage.from_url(page.url, allow_stale=True)
+        schedule_refresh.assert_not_called()
+
+    @override_settings(SCORES_SOFT_MAX_AGE=7, SCORES_HARD_MAX_AGE=30)
+    def test_page_older_than_hard_limit_is_computed(self):
+        page = self.create_page("https://example.com/expired", 40)
+        with mock.patch('api.models.schedule_refresh') as schedule_refresh, \
+                mock.patch.object(WebPage, 'compute_scores', autospec=True,
+                                  side_effect=SingleFlightTestCase.fake_compute_scores):
+            web_page = WebPage.from_url(page.url, allow_stale=True)
+        schedule_refresh.assert_not_called()
+        self.assertEqual(web_page.content_score, 42)
+        self.assertFalse(web_page.to_dict()['stale'])
+
+    def test_stale_page_is_computed_without_allow_stale(self):
+        page = self.create_page("https://example.com/job", 10)
+        with mock.patch.object(WebPage, 'compute_scores', autospec=True,
+                               side_effect=SingleFlightTestCase.fake_compute_scores):
+            self.assertEqual(WebPage.from_url(page.url).content_score, 42)
+
+    def test_failed_refresh_keeps_the_stale_scores(self):
+        page = self.create_page("https://example.com/unreachable", 10)
+        with mock.patch('api.models.extract_article', side_effect=RequestException("Down")):
+            with self.assertRaises(APIException):
+                WebPage.from_url(page.url, keep_stale=True)
+        page.refresh_from_db()
+        self.assertEqual(page.content_score, 40)
+        self.assertFalse(page.is_being_computed)
+
+    def test_failed_computation_deletes_the_stale_page(self):
+        page = self.create_page("https://example.com/gone", 10)
+        with mock.patch.object(WebPage, 'compute_scores', side_effect=ValueError("Boom")):
+            with self.assertRaises(APIException):
+                WebPage.from_url(page.url)
+        self.assertFalse(WebPage.objects.filter(pk=page.pk).exists())
+
+    def test_refresh_keeps_the_stale_scores(self):
+        with mock.patch.object(WebPage, 'from_url') as from_url, mock.patch('api.models.connection'):
+            _refresh("https://example.com/stale")
+        from_url.assert_called_once_with("https://example.com/stale", keep_stale=True)
+
+    @override_settings(ASYNC_SCORING=True)
+    def test_refresh_is_enqueued_in_async_mode(self):
+        page = self.create_page("https://example.com/queued", 10)
+        response = self.client.get('/api/page', {'url': page.url})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['data']['stale'])
+        self.assertTrue(ScoringJob.objects.filter(url=page.url, status=JobStatus.PENDING.name).exists())
+
+
+class PageCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.domain = BaseDomain.objects.create(base_domain="example.com")
+        self.page = WebPage.objects.create(
+            url="https://example.com/cached", base_domain=self.domain, content_score=50,
+            scores_version=WebPage.CURRENT_SCORES_VERSION, total_articles=5
+        )
+
+    def test_cached_response_needs_no_query(self):
+        response = self.client.get('/api/page', {'url': self.page.url})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('max-age', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            cached_response = self.client.get('/api/page', {'url': self.page.url})
+        self.assertEqual(cached_response.content, response.content)
+        self.assertEqual(cached_response['ETag'], response['ETag'])
+
+    def test_if_none_match(self):
+        etag = self.client.get('/api/page', {'url': self.page.url})['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/page', {'url': self.page.url}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        cache.clear()
+        response = self.client.get('/api/page', {'url': self.page.url}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_stale_response_is_not_cached(self):
+        WebPage.objects.filter(pk=self.page.pk).update(scores_version=WebPage.CURRENT_SCORES_VERSION - 1)
+        with mock.patch('api.models.schedule_refresh'):
+            response = self.client.get('/api/page', {'url': self.page.url})
+        self.assertTrue(response.json()['data']['stale'])
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIsNone(page_cache.lookup(self.page.url))
+
+
+class PageCacheInvalidationTestCase(TransactionTestCase):
+    # The cache is invalidated once the transactions are committed, which TestCase never does
+
+    def setUp(self):
+        cache.clear()
+        self.domain = BaseDomain.objects.create(base_domain="example.com")
+        self.page = WebPage.objects.create(
+            url="https://example.com/cached", base_domain=self.domain, content_score=50,
+            scores_version=WebPage.CURRENT_SCORES_VERSION, total_articles=5
+        )
+
+    def test_save_invalidates_the_cache(self):
+        response = self.client.get('/api/page', {'url': self.page.url})
+        self.page.content_score = 70
+        self.page.save()
+
+        new_response = self.client.get('/api/page', {'url': self.page.url})
+        self.assertNotEqual(new_response['ETag'], response['ETag'])
+        self.assertEqual(new_response.json()['data']['scores']['content_score'], 70)
+
+    def test_invalidated_on_commit(self):
+        self.client.get('/api/page', {'url': self.page.url})
+        with transaction.atomic():
+            self.page.delete()
+            self.assertIsNotNone(page_cache.lookup(self.page.url))
+        self.assertIsNone(page_cache.lookup(self.page.url))
+
+
+class BatchTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.domain = BaseDomain.objects.create(base_domain="example.com")
+        self.page = WebPage.objects.create(
+            url="https://example.com/article", base_domain=self.domain, content_score=50,
+            scores_version=WebPage.CURRENT_SCORES_VERSION, total_articles=5
+        )
+
+    @staticmethod
+    def read_lines(response):
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    @override_settings(ASYNC_VIEWS=True)
+    def test_not_streamed_under_asgi(self):
+        response = self.client.get('/api/pages', {'url': [self.page.url]})
+        self.assertFalse(response.streaming)
+        self.assertEqual([json.loads(line)['status'] for line in response.content.decode().splitlines()], ['success'])
+
+    @override_settings(ASYNC_VIEWS=True)
+    def test_pages_are_queued_under_asgi(self):
+        with mock.patch.object(WebPage, 'from_url') as from_url:
+            response = self.client.get('/api/pages', {'url': [self.page.url, 'https://example.com/new']})
+        from_url.assert_not_called()
+        lines = [json.loads(line) for line in response.content.decode().splitlines()]
+        self.assertEqual([line['status'] for line in lines], ['success', 'pending'])
+        self.assertTrue(ScoringJob.objects.filter(url='https://example.com/new').exists())
+
+    def test_known_pages_and_queued_pages(self):
+        response = self.client.get('/api/pages', {
+            'url': [self.page.url, 'https://example.com/new', self.page.url], 'async': 'true'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = self.read_lines(response)
+        self.assertEqual([(line['url'], line['status']) for line in lines],
+                         [(self.page.url, 'success'), ('https://example.com/new', 'pending')])
+        self.assertEqual(lines[0]['data']['scores']['content_score'], 50)
+        self.assertEqual(lines[1]['data']['job_id'], ScoringJob.objects.get(url='https://example.com/new').pk)
+
+    def test_post_json(self):
+        response = self.client.post('/api/pages', json.dumps({'urls': [self.page.url]}),
+                                    content_type='application/json')
+        self.assertEqual([line['status'] for line in self.read_lines(response)], ['success'])
+
+    def test_known_pages_are_loaded_in_bulk(self):
+        other_page = WebPage.objects.create(
+            url="https://example.com/other", base_domain=self.domain, content_score=30,
+            scores_version=WebPage.CURRENT_SCORES_VERSION, total_articles=5
+        )
+        self.domain.ensure_aggregates()
+        with self.assertNumQueries(2):
+            web_pages = WebPage.get_fresh_many([self.page.url, other_page.url, 'https://example.com/new'])
+            for web_page in web_pages.values():
+                web_page.to_dict()
+        self.assertEqual(set(web_pages), {self.page.url, other_page.url})
+
+    @override_settings(BATCH_MAX_URLS=1)
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get('/api/pages').status_code, 400)
+        self.assertEqual(self.client.post('/api/pages', 'not json', content_type='application/json').status_code, 400)
+        response = self.client.get('/api/pages', {'url': [self.page.url, 'https://example.com/new']})
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncScoringTestCase(TestCase):
+    @staticmethod
+    def run_async(func, *args):
+        """
+        Run a coroutine function in an event loop of its own, whose HTTP session is closed with it.
+        """
+        async def run():
+            try:
+                return await func(*args)
+            finally:
+                await async_client.close()
+
+        return async_to_sync(run)()
+
+    @staticmethod
+    async def fake_get(url, **kwargs):
+        if 'error' in url:
+            raise RequestException("unreachable")
+        if 'slow' in url:
+            await asyncio.sleep(0.5)
+        return 200, url.encode()
+
+    @staticmethod
+    async def fake_compute_scores(web_page):
+        web_page.content_score = 42
+        return await async_scoring.db_sync_to_async(web_page._finish_scores)()
+
+    @override_settings(RELATED_ARTICLE_TIMEOUT=0.2)
+    def test_fetch_related_articles(self):
+        urls = ['https://example.com/error', 'https://example.com/slow', 'https://example.com/article']
+        with mock.patch('api.async_client.get', side_effect=self.fake_get), \
+                mock.patch('api.async_scoring.goose') as goose:
+            goose.extract.side_effect = lambda url, raw_html: mock.Mock(title=raw_html.decode())
+            results = self.run_async(async_scoring.fetch_related_articles, urls)
+        self.assertEqual([url for url, _ in results], urls)
+        self.assertIsInstance(results[0][1], RequestException)
+        self.assertIsInstance(results[1][1], RequestException)
+        self.assertEqual(results[2][1].title, urls[2])
+
+    def test_content_analysis_without_queries(self):
+        # Run out of the thread of the database queries
+        article = mock.Mock(cleaned_text="Le président a annoncé une réforme des retraites.")
+        linked_articles = [
+            ('https://other.com/a', ExtractedArticle(url='https://other.com/a', title="A", cleaned_text="Texte")),
+            ('https://other.com/b', RequestException("timeout")),
+        ]
+        with mock.patch.object(WebPage, 'nouns_batch', return_value=[["président"], ["texte"]]), \
+                self.assertNumQueries(0):
+            analysis = WebPage(url="https://example.com/article")._analyze_content(article, linked_articles)
+        self.assertEqual([url for url, _ in analysis.candidate_articles], ['https://other.com/a'])
+
+    def test_client_errors_are_requests_ones(self):
+        with self.assertRaises(RequestException):
+            self.run_async(async_client.get, 'http://127.0.0.1:1/article')
+
+    def test_from_url(self):
+        BaseDomain.objects.create(base_domain="example.com")
+        with mock.patch('api.async_scoring.compute_scores', side_effect=self.fake_compute_scores) as compute_scores:
+            web_page = self.run_async(async_scoring.from_url, "https://example.com/article")
+            self.assertEqual(web_page.content_score, 42)
+            self.assertIsNone(WebPage.objects.get(url=web_page.url).lease_expires_at)
+
+            self.run_async(async_scoring.from_url, "https://example.com/article")
+        self.assertEqual(compute_scores.call_count, 1)
+
+    def test_unreachable_page(self):
+        with mock.patch('api.async_client.get', side_effect=self.fake_get):
+            with self.assertRaisesRegex(APIException, "pas joignable"):
+                self.run_async(async_scoring.from_url, "https://example.com/error")
+        self.assertFalse(WebPage.objects.exists())
+
+    def test_view(self):
+        request = RequestFactory().get('/api/page', {'url': 'https://example.com/article'})
+        with mock.patch('api.async_scoring.compute_scores', side_effect=self.fake_compute_scores):
+            response = self.run_async(views.web_page_score_async_view, request)
+        self.assertEqual(json.loads(response.content)['data']['scores']['content_score'], 42)
+
+
+class ProgressStreamTestCase(TestCase):
+    def test_cached_page(self):
+        cache.clear()
+        page_cache.store("https://example.com/article", '"etag"', json.dumps({'status': 'success', 'data': {}}))
+        response = self.client.get('/api/page/stream', {'url': "https://example.com/article"})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(b''.join(response.streaming_content).decode(),
+                         'event: result\ndata: {"status": "success", "data": {}}\n\n')
+
+    def test_no_url(self):
+        self.assertEqual(self.client.get('/api/page/stream').status_code, 400)
+
+    @override_settings(ASYNC_VIEWS=True)
+    def test_not_available_under_asgi(self):
+        with mock.patch.object(WebPage, 'from_url') as from_url:
+            response = self.client.get('/api/page/stream', {'url': "https://example.com/article"})
+        from_url.assert_not_called()
+        self.assertEqual(response.status_code, 501)
+        self.assertIn('/api/job', response.json()['data']['message'])
+
+    def test_content_score_progress(self):
+        steps = []
+        page = WebPage(url="https://example.com/article")
+        fingerprints = [
+            ScoredRelatedArticle(url="https://other.com/1", title="1", stems='{"a": 1, "b": 1, "c": 1}'),
+            ScoredRelatedArticle(url="https://other.com/2", title="2", stems='{"d": 1}'),
+        ]
+        with mock.patch.object(WebPage, '_store_interesting_related_articles'):
+            page._score_content(Counter({"a": 2, "b": 2, "c": 2, "d": 1}), fingerprints,
+                                progress=lambda step, details: steps.append((step, details)))
+        self.assertEqual(steps, [
+            ('related_article', {'url': "https://other.com/1", 'status': 'scored', 'score': 100}),
+            ('related_article', {'url': "https://other.com/2", 'status': 'scored', 'score': 0}),
+        ])
+
+
+@override_settings(MAX_CONCURRENT_COMPUTATIONS=1, ADMISSION_QUEUE_SIZE=1, ADMISSION_WAIT_TIMEOUT=0.1,
+                   NODE_MAX_CONCURRENT_COMPUTATIONS=0)
+class AdmissionTestCase(TestCase):
+    def test_process_limit(self):
+        with admission.computation_slot():
+            self.assertEqual(admission.snapshot()['running'], 1)
+            with self.assertRaises(OverloadedException):
+                admission.acquire()
+        with admission.computation_slot():
+            pass
+        self.assertEqual(admission.snapshot()['running'], 0)
+
+    @override_settings(ADMISSION_WAIT_TIMEOUT=5)
+    def test_waiting_for_a_slot(self):
+        node_slot = admission.acquire()
+        threading.Timer(0.1, admission.release, [node_slot]).start()
+        with admission.computation_slot():
+            pass
+        self.assertEqual(admission.snapshot()['waiting'], 0)
+
+    @override_settings(ADMISSION_QUEUE_SIZE=0)
+    def test_full_queue(self):
+        rejections = admission.snapshot()['rejections']
+        with admission.computation_slot():
+            start = time.monotonic()
+            with self.assertRaises(OverloadedException):
+                admission.acquire()
+            self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(admission.snapshot()['rejections'], rejections + 1)
+
+    def test_node_limit(self):
+        with tempfile.TemporaryDirectory() as lock_dir:
+            with self.settings(MAX_CONCURRENT_COMPUTATIONS=2, NODE_MAX_CONCURRENT_COMPUTATIONS=1,
+                               ADMISSION_LOCK_DIR=lock_dir):
+                with admission.computation_slot():
+                    with self.assertRaises(OverloadedException):
+                        admission.acquire()
+                with admission.computation_slot():
+                    pass
+
+    def test_overloaded_response(self):
+        BaseDomain.objects.create(base_domain="example.com")
+        with mock.patch('api.admission.acquire', side_effect=OverloadedException(30)), \
+                mock.patch.object(WebPage, 'compute_scores') as compute_scores:
+            response = self.client.get('/api/page', {'url': "https://example.com/article"})
+        compute_scores.assert_not_called()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        # The page created for the computation is removed, another request can compute it
+        self.assertFalse(WebPage.objects.exists())
+
+    def test_overloaded_job_is_put_back(self):
+        job = ScoringJob.enqueue("https://example.com/article")
+        job = ScoringJob.claim()
+        with mock.patch.object(WebPage, 'from_url', side_effect=OverloadedException(30)):
+            job.run()
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.PENDING.name)
+
+
+class ProbesTestCase(TestCase):
+    def setUp(self):
+        health._database_checked_at = None
+
+    def test_liveness_without_query(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ping')
+        self.assertEqual(response.json()['status'], 'alive')
+
+    def test_readiness_database_check_is_cached(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'ready')
+        with self.assertNumQueries(0):
+            self.client.get('/api/ready')
+
+    def test_unavailable_database(self):
+        with mock.patch.object(connection, 'cursor', side_effect=Exception("connection refused")):
+            response = self.client.get('/api/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'unavailable')
+
+    @override_settings(MAX_CONCURRENT_COMPUTATIONS=0, ADMISSION_QUEUE_SIZE=0)
+    def test_busy_when_computations_cant_wait(self):
+        response = self.client.get('/api/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'busy')
+
+
+class ClearScoresTestCase(TestCase):
+    def setUp(self):
+        self.domain = BaseDomain.objects.create(base_domain="example.com")
+
+    def create_page(self, name, content_score=None, scores_version=WebPage.CURRENT_SCORES_VERSION, age_minutes=0,
+                    **kwargs):
+        page = WebPage.objects.create(
+            url=f"https://example.com/{name}", base_domain=self.domain, content_score=content_score,
+            scores_version=scores_version, total_articles=0, **kwargs
+        )
+        WebPage.objects.filter(pk=page.pk).update(updated_at=timezone.now() - datetime.timedelta(minutes=age_minutes))
+        return page
+
+    def test_clear_empty_scores_keeps_recent_pages(self):
+        for i in range(5):
+            self.create_page(f"empty{i}", age_minutes=120)
+        self.create_page("recent", age_minutes=5)
+        self.create_page("computing", age_minutes=120,
+                         lease_expires_at=timezone.now() + datetime.timedelta(minutes=1))
+        self.create_page("scored", content_score=50, age_minutes=120)
+
+        out = StringIO()
+        call_command('clear_empty_scores', batch_size=2, pause=0, stdout=out)
+        self.assertIn('Successfully deleted 5 pages', out.getvalue())
+        self.assertEqual(out.getvalue().count('resume with --start-pk'), 3)
+        self.assertEqual(sorted(WebPage.objects.values_list('url', flat=True)),
+                         ["https://example.com/computing", "https://example.com/recent", "https://example.com/scored"])
+        self.domain.refresh_from_db()
+        self.assertEqual(self.domain.web_pages_count, 3)
+
+    def test_clear_old_scores_by_batches(self):
+        old_pages = [self.create_page(f"old{i}", content_score=50, scores_version=WebPage.CURRENT_SCORES_VERSION - 2)
+                     for i in range(3)]
+        InterestingRelatedArticle.objects.create(title="Related", url="https://other.com/1", score=50,
+                                                 web_page=old_pages[0], base_domain=self.domain)
+        self.create_page("current", content_score=50)
+
+        out = StringIO()
+        call_command('clear_old_scores', batch_size=2, pause=0, start_pk=old_pages[1].pk, stdout=out)
+        self.assertIn('Successfully deleted 2 pages', out.getvalue())
+        self.assertEqual(WebPage.objects.count(), 2)
+        self.assertTrue(InterestingRelatedArticle.objects.exists())
+
+        call_command('clear_old_scores', pause=0, stdout=StringIO())
+        self.assertEqual(list(WebPage.objects.values_list('url', flat=True)), ["https://example.com/current"])
+        self.assertFalse(InterestingRelatedArticle.objects.exists())
+
+
+@mock.patch('api.models.nlp', mock.Mock())
+class RescoreTestCase(TestCase):
+    def setUp(self):
+        self.domain = BaseDomain.objects.create(base_domain="example.com")
+        other_domain = BaseDomain.objects.create(base_domain="other.com")
+        self.pages = [
+            WebPage.objects.create(
+                url=url, base_domain=domain, content_score=50, scores_version=version, total_articles=5
+            )
+            for url, domain, version in [
+                ("https://example.com/1", self.domain, WebPage.CURRENT_SCORES_VERSION - 1),
+                ("https://example.com/error", self.domain, WebPage.CURRENT_SCORES_VERSION - 1),
+                ("https://example.com/current", self.domain, WebPage.CURRENT_SCORES_VERSION),
+                ("https://other.com/1", other_domain, WebPage.CURRENT_SCORES_VERSION - 2),
+            ]
+        ]
+        self.checkpoint = tempfile.NamedTemporaryFile(suffix='.json', delete=False).name
+        self.addCleanup(lambda: os.path.exists(self.checkpoint) and os.remove(self.checkpoint))
+        self.rescored = []
+
+    def fake_from_url(self, url, force=False, keep_stale=False):
+        self.assertTrue(force)
+        self.assertTrue(keep_stale)
+        self.rescored.append(url)
+        if 'error' in url:
+            raise APIException.warning("Le site n'est pas joignable")
+
+    def rescore(self, **options):
+        out = StringIO()
+        with mock.patch.object(WebPage, 'from_url', side_effect=self.fake_from_url):
+            call_command('rescore', processes=0, per_host_interval=0, checkpoint=self.checkpoint, stdout=out,
+                         **options)
+        return out.getvalue()
+
+    def test_outdated_pages_are_rescored(self):
+        out = self.rescore()
+        self.assertEqual(self.rescored, ["https://example.com/1", "https://example.com/error", "https://other.com/1"])
+        self.assertIn("Successfully rescored 2 pages, 1 failed", out)
+        self.assertIn("1 x Le site n'est pas joignable", out)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_filters(self):
+        self.rescore(domain=["other.com"])
+        self.assertEqual(self.rescored, ["https://other.com/1"])
+
+        self.rescored = []
+        self.rescore(version_below=WebPage.CURRENT_SCORES_VERSION - 1)
+        self.assertEqual(self.rescored, ["https://other.com/1"])
+
+    def test_fresh_pages_are_computed_again(self):
+        def compute_scores(web_page, progress=None):
+            self.rescored.append(web_page.url)
+            web_page.lease_expires_at = None
+            web_page.save()
+            return web_page
+
+        with mock.patch.object(WebPage, 'compute_scores', autospec=True, side_effect=compute_scores):
+            out = StringIO()
+            call_command('rescore', version_below=WebPage.CURRENT_SCORES_VERSION + 1, domain=["example.com"],
+                         processes=0, per_host_interval=0, checkpoint=self.checkpoint, stdout=out)
+        self.assertIn("https://example.com/current", self.rescored)
+        self.assertIn("Successfully rescored 3 pages, 0 failed", out.getvalue())
+
+    def test_failure_keeps_the_outdated_scores(self):
+        with mock.patch.object(WebPage, 'compute_scores', autospec=True, side_effect=ValueError("Boom")):
+            call_command('rescore', domain=["other.com"], processes=0, per_host_interval=0,
+                         checkpoint=self.checkpoint, stdout=StringIO())
+        self.assertEqual(WebPage.objects.get(pk=self.pages[3].pk).content_score, 50)
+
+    def test_nlp_is_required(self):
+        with mock.patch('api.models.nlp', None):
+            with self.assertRaisesRegex(CommandError, "LOAD_NLP"):
+                self.rescore()
+        self.assertEqual(self.rescored, [])
+
+    def test_resume_from_checkpoint(self):
+        with open(self.checkpoint, 'w') as checkpoint:
+            json.dump({'last_pk': self.pages[1].pk, 'rescored': 1, 'failed': 1}, checkpoint)
+        out = self.rescore(resume=True)
+        self.assertEqual(self.rescored, ["https://other.com/1"])
+        self.assertIn("Successfully rescored 2 pages, 1 failed", out)
+
+    def test_rate_limiter(self):
+        limiter = RateLimiter(0.2)
+        limiter.take("example.com")
+        self.assertGreater(limiter.delay("example.com"), 0.1)
+        self.assertEqual(limiter.delay("other.com"), 0)
+        start = time.monotonic()
+        limiter.wait("example.com")
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+
+@mock.patch('api.models.nlp', mock.Mock())
+class WarmCacheTestCase(TestCase):
+    def test_only_pages_not_fresh_are_scored(self):
+        domain = BaseDomain.objects.create(base_domain="example.com")
+        WebPage.objects.create(url="https://example.com/fresh", base_domain=domain, content_score=50,
+                               scores_version=WebPage.CURRENT_SCORES_VERSION, total_articles=5)
+        WebPage.objects.create(url="https://example.com/old", base_domain=domain, content_score=50,
+                               scores_version=WebPage.CURRENT_SCORES_VERSION - 1, total_articles=5)
+        lines = "\n".join([
+            "https://example.com/fresh",
+            '{"url": "https://example.com/old", "title": "Old"}',
+            "",
+            "# Front page",
+            "https://example.com/new",
+            "https://example.com/error",
+            "https://example.com/new",
+        ])
+
+        def fake_from_url(url):
+            if 'error' in url:
+                raise APIException.warning("Le site n'est pas joignable")
+
+        out = StringIO()
+        with mock.patch('sys.stdin', StringIO(lines)), \
+                mock.patch.object(WebPage, 'from_url', side_effect=fake_from_url) as from_url:
+            call_command('warm_cache', rate=0, stdout=out)
+        self.assertEqual(sorted(call[0][0] for call in from_url.call_args_list),
+                         ["https://example.com/error", "https://example.com/new", "https://example.com/old"])
+        self.assertIn("1 pages already scored, 3 to score", out.getvalue())
+        self.assertIn("Successfully scored 2 pages", out.getvalue())
+        self.assertIn("1 failed", out.getvalue())
+
+    def test_invalid_json_line(self):
+        with mock.patch('sys.stdin', StringIO('{"url": ')):
+            with self.assertRaises(CommandError):
+                call_command('warm_cache', stdout=StringIO())
+
+    def test_nlp_is_required(self):
+        with mock.patch('api.models.nlp', None), mock.patch('sys.stdin', StringIO("https://example.com/new")), \
+                mock.patch.object(WebPage, 'from_url') as from_url:
+            with self.assertRaisesRegex(CommandError, "LOAD_NLP"):
+                call_command('warm_cache', rate=0, stdout=StringIO())
+        from_url.assert_not_called()
+
+
+@override_settings(METRICS_DIR='')
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.domain = BaseDomain.objects.create(base_domain="example.com")
+
+    def test_histogram_buckets_are_cumulated(self):
+        for value in (0.02, 0.3, 1000):
+            metrics.observe('page_request_seconds', value, result='scores')
+        output = metrics.render()
+        self.assertIn('# TYPE fake_news_detector_page_request_seconds histogram', output)
+        self.assertIn('fake_news_detector_page_request_seconds_bucket{result="scores",le="0.01"} 0', output)
+        self.assertIn('fake_news_detector_page_request_seconds_bucket{result="scores",le="0.05"} 1', output)
+        self.assertIn('fake_news_detector_page_request_seconds_bucket{result="scores",le="0.5"} 2', output)
+        self.assertIn('fake_news_detector_page_request_seconds_bucket{result="scores",le="+Inf"} 3', output)
+        self.assertIn('fake_news_detector_page_request_seconds_count{result="scores"} 3', output)
+
+    def test_timer(self):
+        with metrics.timer('extraction'):
+            pass
+        self.assertIn('fake_news_detector_scoring_stage_seconds_count{stage="extraction"} 1', metrics.render())
+
+    def test_computation_is_measured(self):
+        def compute_scores(web_page, progress=None):
+            web_page.content_score = 42
+            web_page.lease_expires_at = None
+            web_page.save()
+            return web_page
+
+        with mock.patch.object(WebPage, 'compute_scores', autospec=True, side_effect=compute_scores):
+            WebPage.from_url("https://example.com/new")
+        WebPage.from_url("https://example.com/new")
+        output = metrics.render()
+        self.assertIn('fake_news_detector_page_lookups_total{result="compute"} 1', output)
+        self.assertIn('fake_news_detector_page_lookups_total{result="fresh"} 1', output)
+        self.assertIn('fake_news_detector_scoring_seconds_count 1', output)
+        self.assertIn('fake_news_detector_scoring_queries_bucket{le="5.0"} 1', output)
+
+    def test_related_articles_are_counted(self):
+        page = WebPage.objects.create(url="https://example.com/article", base_domain=self.domain,
+                                      scores_version=WebPage.CURRENT_SCORES_VERSION, total_articles=0)
+        article = mock.Mock(cleaned_text="texte " * 50)
+        linked_articles = [
+            ('https://other.com/blocked', ExtractedArticle(url='https://other.com/blocked',
+                                                           title="You have been blocked", cleaned_text="Texte")),
+            ('https://other.com/copy', ExtractedArticle(url='https://other.com/copy', title="Copy",
+                                                        cleaned_text=article.cleaned_text)),
+            ('https://other.com/error', RequestException("timeout")),
+        ]
+        with mock.patch.object(WebPage, 'nouns_batch', return_value=[[]]), \
+                mock.patch.object(WebPage, '_score_content'), \
+                mock.patch.object(WebPage, '_store_related_fingerprints'):
+            page._compute_content_score({'value': []}, article, linked_articles)
+        output = metrics.render()
+        self.assertIn('fake_news_detector_related_articles_total{result="blocked"} 1', output)
+        self.assertIn('fake_news_detector_related_articles_total{result="too_similar"} 1', output)
+        self.assertIn('fake_news_detector_related_articles_total{result="failed"} 1', output)
+        self.assertIn('fake_news_detector_scoring_stage_seconds_count{stage="nlp"} 1', output)
+
+    def test_cache_hits_and_misses_are_exported(self):
+        WebPage.tokens(["ministères", "ministères"])
+        stems = stems_cache_stats()
+        output = metrics.render()
+        self.assertIn(f"fake_news_detector_stems_cache_hits_total {stems['hits']}", output)
+        self.assertIn(f"fake_news_detector_stems_cache_misses_total {stems['misses']}", output)
+        self.assertIn('fake_news_detector_base_domains_cache_hits_total', output)
+
+    def test_waiting_request_is_counted_once(self):
+        page = WebPage(url="https://example.com/new")
+        lookups = [(None, False), (None, False), (page, False)]
+        with mock.patch.object(WebPage, '_lookup_for_computation', side_effect=lookups), \
+                mock.patch('api.models._wait_for_computation'):
+            self.assertIs(WebPage.from_url(page.url), page)
+        self.assertIn('fake_news_detector_page_lookups_total{result="computing"} 1', metrics.render())
+
+    def test_concurrent_flushes(self):
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir):
+            metrics.increment('page_lookups', result='fresh')
+            threads = [threading.Thread(target=metrics.flush) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual([file_name for file_name in os.listdir(metrics_dir) if not file_name.startswith('.')],
+                             [f'{os.getpid()}.json'])
+            with open(os.path.join(metrics_dir, f'{os.getpid()}.json')) as metrics_file:
+                self.assertEqual(json.load(metrics_file)['counters'][0], ['page_lookups', [['result', 'fresh']], 1])
+
+    def test_flushed_in_the_background(self):
+        self.addCleanup(setattr, metrics, '_flusher_pid', metrics._flusher_pid)
+        with mock.patch('threading.Thread') as thread:
+            metrics._flusher_pid = None
+            metrics.increment('page_lookups', result='fresh')
+            metrics.increment('page_lookups', result='fresh')
+        thread.assert_called_once_with(target=metrics._flush_periodically, name='metrics-flusher', daemon=True)
+
+    def test_metrics_of_the_workers_are_summed(self):
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir):
+            with open(os.path.join(metrics_dir, '999999999.json'), 'w') as other_worker:
+                json.dump({
+                    'pid': 999999999,
+                    'counters': [['page_lookups', [['result', 'fresh']], 2]],
+                    'histograms': [['page_request_seconds', [['result', 'cache']],
+                                    [0.1, 'inf'], [1, 1], 10.05, 2]],
+                    'gauges': [['computations_running', [], 3]],
+                }, other_worker)
+            metrics.increment('page_lookups', result='fresh')
+            metrics.observe('page_request_seconds', 0.01, buckets=(0.1, math.inf), result='cache')
+            output = self.client.get('/metrics').content.decode()
+        self.assertIn('fake_news_detector_page_lookups_total{result="fresh"} 3', output)
+        self.assertIn('fake_news_detector_page_request_seconds_bucket{result="cache",le="0.1"} 2', output)
+        self.assertIn('fake_news_detector_page_request_seconds_bucket{result="cache",le="+Inf"} 3', output)
+        # The gauges of a dead worker are left out
+        self.assertIn('fake_news_detector_computations_running 0', output)
+
+    def test_dead_workers_are_archived(self):
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir):
+            for pid in (999999998, 999999999):
+                with open(os.path.join(metrics_dir, f'{pid}.json'), 'w') as other_worker:
+                    json.dump({'pid': pid, 'counters': [['page_lookups', [['result', 'fresh']], 2]],
+                               'histograms': [], 'gauges': []}, other_worker)
+            metrics.render()
+            self.assertEqual(sorted(file_name for file_name in os.listdir(metrics_dir) if file_name.endswith('.json')),
+                             sorted([f'{os.getpid()}.json', metrics.ARCHIVE]))
+            output = metrics.render()
+        self.assertIn('fake_news_detector_page_lookups_total{result="fresh"} 4', output)
+
+    def test_file_of_a_reused_pid_is_archived(self):
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir):
+            with open(os.path.join(metrics_dir, f'{os.getpid()}.json'), 'w') as previous_process:
+                json.dump({'pid': os.getpid(), 'token': 'previous',
+                           'counters': [['page_lookups', [['result', 'fresh']], 2]],
+                           'histograms': [], 'gauges': []}, previous_process)
+            metrics.increment('page_lookups', result='fresh')
+            output = metrics.render()
+            with open(os.path.join(metrics_dir, metrics.ARCHIVE)) as archive:
+                self.assertEqual(json.load(archive)['counters'], [['page_lookups', [['result', 'fresh']], 2]])
+        self.assertIn('fake_news_detector_page_lookups_total{result="fresh"} 3', output)
+
+    def test_only_recording_processes_flush_at_exit(self):
+        self.addCleanup(setattr, metrics, '_flusher_pid', metrics._flusher_pid)
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir):
+            metrics._flusher_pid = None
+            metrics._flush_at_exit()
+            self.assertFalse(os.path.exists(os.path.join(metrics_dir, f'{os.getpid()}.json')))
+            metrics._flusher_pid = os.getpid()
+            metrics._flush_at_exit()
+            self.assertTrue(os.path.exists(os.path.join(metrics_dir, f'{os.getpid()}.json')))
+
+
+class ConcurrentRequestsTestCase(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_requests_share_the_computation(self):
+        BaseDomain.objects.create(base_domain="example.com")
+        started = threading.Event()
+        calls = []
+
+        def slow_compute_scores(web_page, progress=None):
+            calls.append(web_page.url)
+            started.set()
+            time.sleep(0.3)
+            return SingleFlightTestCase.fake_compute_scores(web_page)
+
+        results = []
+        with mock.patch.object(WebPage, 'compute_scores', autospec=True, side_effect=slow_compute_scores):
+            first = threading.Thread(target=lambda: results.append(WebPage.from_url("https://example.com/viral")))
+            first.start()
+            started.wait(5)
+            results.append(WebPage.from_url("https://example.com/viral"))
+            first.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([page.content_score for page in results], [42, 42])
+
+    # Concurrent writes lock the tables of the in-memory SQLite database
+    @override_settings(BATCH_WORKERS=1)
+    def test_batch_computes_the_unknown_pages(self):
+        BaseDomain.objects.create(base_domain="example.com")
+        urls = ["https://example.com/first", "https://example.com/second"]
+        with mock.patch.object(WebPage, 'compute_scores', autospec=True,
+                               side_effect=SingleFlightTestCase.fake_compute_scores):
+            response = self.client.get('/api/pages', {'url': urls})
+            lines = BatchTestCase.read_lines(response)
+
+        self.assertEqual(sorted(line['url'] for line in lines), urls)
+        self.assertEqual([line['data']['scores']['content_score'] for line in lines], [42, 42])
+
+    def test_progress_stream(self):
+        BaseDomain.objects.create(base_domain="example.com")
+
+        def compute_scores(web_page, progress=None):
+            progress('extraction', {'title': "Titre"})
+            return SingleFlightTestCase.fake_compute_scores(web_page)
+
+        with mock.patch.object(WebPage, 'compute_scores', autospec=True, side_effect=compute_scores):
+            response = self.client.get('/api/page/stream', {'url': "https://example.com/article"})
+            content = b''.join(response.streaming_content).decode()
+
+        events = [event.split('\n') for event in content.strip().split('\n\n')]
+        self.assertEqual([event[0] for event in events], ['event: extraction', 'event: result'])
+        self.assertEqual(json.loads(events[0][1][len('data: '):]), {'title': "Titre"})
+        self.assertEqual(json.loads(events[1][1][len('data: '):])['data']['scores']['content_score'], 42)
@@ -13,10 +13,15 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('page', views.web_page_score_view),
+    path('page', views.web_page_score_async_view if settings.ASYNC_VIEWS else views.web_page_score_view),
+    path('page/stream', views.web_page_score_stream_view),
+    path('pages', views.web_pages_score_view),
+    path('job', views.job_status_view),
     path('ping', views.ping_view),
+    path('ready', views.ready_view),
 ]
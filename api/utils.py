@@ -1,7 +1,91 @@
+import json
+import threading
+import time
+from collections import Counter
 from enum import Enum
+from typing import Hashable, Iterator, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+TRACKING_PARAMETERS_PREFIXES = ('utm_', 'xtor', 'at_', 'fbclid', 'gclid', 'ocid')
 
 
 class ChoiceEnum(Enum):
     @classmethod
     def choices(cls):
         return tuple((x.name, x.value) for x in cls)
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalize an url so the different links to the same article share the same key:
+    lower case scheme and host, no fragment and no tracking parameters.
+    """
+    parts = urlsplit(url.strip())
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not key.lower().startswith(TRACKING_PARAMETERS_PREFIXES)]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', urlencode(query), ''))
+
+
+def dump_counter(counter: Counter) -> str:
+    return json.dumps(counter, separators=(',', ':'), sort_keys=True)
+
+
+def load_counter(serialized: str) -> Counter:
+    return Counter(json.loads(serialized))
+
+
+class RateLimiter:
+    """
+    Allow one call per key every `interval` seconds, for instance per host.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_allowed = {}
+        self._lock = threading.Lock()
+
+    def delay(self, key: Hashable = None) -> float:
+        """
+        :return: Seconds before a call is allowed for the key
+        """
+        with self._lock:
+            return max(0.0, self._next_allowed.get(key, 0.0) - time.monotonic())
+
+    def take(self, key: Hashable = None) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._next_allowed[key] = max(now, self._next_allowed.get(key, 0.0)) + self.interval
+
+    def wait(self, key: Hashable = None) -> None:
+        """
+        Wait until a call is allowed for the key and count it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            allowed_at = max(now, self._next_allowed.get(key, 0.0))
+            self._next_allowed[key] = allowed_at + self.interval
+        time.sleep(allowed_at - now)
+
+
+def host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def delete_by_batches(queryset, batch_size: int, pause: float = 0, start_pk: int = 0) -> Iterator[Tuple[int, int]]:
+    """
+    Delete the rows of the queryset by ranges of at most batch_size primary keys, in increasing order,
+    so that the cascaded rows collected and the locks taken stay small.
+
+    :param pause: Seconds to wait between two batches, letting the other queries go through
+    :param start_pk: Smallest primary key to delete, to resume an interrupted deletion
+    :return: For each batch, the number of rows of the queryset deleted and the last primary key of the range
+    """
+    label = queryset.model._meta.label
+    while True:
+        pks = list(queryset.filter(pk__gte=start_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        _, deleted = queryset.filter(pk__gte=pks[0], pk__lte=pks[-1]).delete()
+        yield deleted.get(label, 0), pks[-1]
+        start_pk = pks[-1] + 1
+        time.sleep(pause)
@@ -1,9 +1,24 @@
+import json
 import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Tuple
 
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
 
-from api.exceptions import APIException
-from api.models import WebPage
+from api import async_scoring, health, http_client, metrics, page_cache
+from api.exceptions import APIException, OverloadedException
+from api.models import JobStatus, Progress, ScoringJob, WebPage
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +31,104 @@ LOG_LEVELS = {
 }
 
 
+def _exception_payload(request, exception: APIException, web_page_url: str) -> dict:
+    message = ' - '.join(filter(None, [exception.message, exception.internal_message, web_page_url]))
+    kwargs = {}
+    if exception.level >= logging.ERROR:
+        kwargs["exc_info"] = True
+    logger.log(exception.level, message, extra={'request': request}, **kwargs)
+
+    return {
+        'status': LOG_LEVELS.get(exception.level, 'unknown'),
+        'data': {
+            'message': exception.message
+        }
+    }
+
+
+def _exception_response(request, exception: APIException, web_page_url: str) -> JsonResponse:
+    response = JsonResponse(_exception_payload(request, exception, web_page_url))
+    if isinstance(exception, OverloadedException):
+        response.status_code = 503
+        response['Retry-After'] = str(exception.retry_after)
+    return response
+
+
+def _job_payload(job: ScoringJob) -> dict:
+    if job.status == JobStatus.FAILED.name:
+        return {
+            'status': LOG_LEVELS.get(job.level, 'unknown'),
+            'data': {
+                'message': job.message
+            }
+        }
+
+    if job.status == JobStatus.DONE.name:
+        if job.web_page is None:
+            # Deleted since the job was done
+            return {
+                'status': 'info',
+                'data': {
+                    'message': "Le score de cet article n'est plus disponible, merci de le demander à nouveau."
+                }
+            }
+        return {
+            'status': 'success',
+            'data': job.web_page.to_dict()
+        }
+
+    return {
+        'status': 'pending',
+        'data': {
+            'job_id': job.pk,
+            'job_status': JobStatus[job.status].value,
+            'message': 'Cet article est en cours de traitement.',
+        }
+    }
+
+
+def _job_response(job: ScoringJob) -> JsonResponse:
+    payload = _job_payload(job)
+    return JsonResponse(payload, status=202 if payload['status'] == 'pending' else 200)
+
+
+def _etag_matches(request, etag: str) -> bool:
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return etag in etags or '*' in etags
+
+
+def _cacheable_response(request, etag: str, content: str) -> HttpResponse:
+    if _etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={settings.PAGE_CACHE_MAX_AGE}'
+    return response
+
+
+def _web_page_response(request, web_page: WebPage) -> HttpResponse:
+    if not web_page.is_fresh:
+        # Stale scores are being computed again, they must not be kept
+        response = JsonResponse({
+            'status': 'success',
+            'data': web_page.to_dict()
+        })
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    etag = page_cache.etag(web_page)
+    if _etag_matches(request, etag):
+        return _cacheable_response(request, etag, '')
+
+    content = json.dumps({
+        'status': 'success',
+        'data': web_page.to_dict()
+    }, cls=DjangoJSONEncoder)
+    page_cache.store(web_page.url, etag, content)
+    return _cacheable_response(request, etag, content)
+
+
 def web_page_score_view(request):
     web_page_url = request.GET.get('url')
     logger.debug(f"Found url {web_page_url}")
@@ -29,36 +142,280 @@ def web_page_score_view(request):
         }, status=400)
 
     logger.info(f"Received request for following URL : {web_page_url}")
+    start = time.monotonic()
+    cached = page_cache.lookup(web_page_url)
+    if cached is not None:
+        metrics.observe('page_request_seconds', time.monotonic() - start, result='cache')
+        return _cacheable_response(request, *cached)
+
+    asynchronous = settings.ASYNC_SCORING or request.GET.get('async', '').lower() in ('1', 'true')
 
+    result = 'error'
     try:
-        web_page = WebPage.from_url(url=web_page_url)
-        return JsonResponse({
+        if asynchronous:
+            web_page = WebPage.get_fresh(web_page_url, allow_stale=True)
+            if web_page is None:
+                result = 'job'
+                return _job_response(ScoringJob.enqueue(web_page_url))
+        else:
+            web_page = WebPage.from_url(url=web_page_url, allow_stale=True)
+        result = 'scores'
+        return _web_page_response(request, web_page)
+    except APIException as exception:
+        return _exception_response(request, exception, web_page_url)
+    finally:
+        metrics.observe('page_request_seconds', time.monotonic() - start, result=result)
+
+
+async def web_page_score_async_view(request):
+    """
+    Same as web_page_score_view, the scores being computed on the event loop of the ASGI server.
+    """
+    web_page_url = request.GET.get('url')
+    asynchronous = settings.ASYNC_SCORING or request.GET.get('async', '').lower() in ('1', 'true')
+    if not web_page_url or asynchronous or page_cache.lookup(web_page_url) is not None:
+        # Nothing to compute during the request
+        return await sync_to_async(web_page_score_view, thread_sensitive=True)(request)
+
+    logger.info(f"Received request for following URL : {web_page_url}")
+    try:
+        web_page = await async_scoring.from_url(web_page_url, allow_stale=True)
+        return await sync_to_async(_web_page_response, thread_sensitive=True)(request, web_page)
+    except APIException as exception:
+        return _exception_response(request, exception, web_page_url)
+
+
+def _streaming_response(content: Iterator[str], content_type: str) -> HttpResponse:
+    """
+    Under ASGI, Django iterates over the content of a StreamingHttpResponse on the event loop: the content,
+    which must then need no computation, is produced by the view and sent at once.
+    """
+    if settings.ASYNC_VIEWS:
+        return HttpResponse(''.join(content), content_type=content_type)
+    return StreamingHttpResponse(content, content_type=content_type)
+
+
+def _batch_urls(request) -> Optional[List[str]]:
+    if request.method == 'POST':
+        try:
+            urls = json.loads(request.body.decode()).get('urls')
+        except (ValueError, AttributeError):
+            return None
+    else:
+        urls = request.GET.getlist('url')
+    if not isinstance(urls, list) or not all(isinstance(url, str) and url for url in urls):
+        return None
+    # Without duplicates, in the order of the request
+    return list(OrderedDict.fromkeys(urls))
+
+
+def _compute_web_page(request, web_page_url: str, progress: Optional[Progress] = None) -> dict:
+    try:
+        web_page = WebPage.from_url(url=web_page_url, allow_stale=True, progress=progress)
+        return {
             'status': 'success',
             'data': web_page.to_dict()
-        })
+        }
     except APIException as exception:
-        message = ' - '.join(filter(None, [exception.message, exception.internal_message, web_page_url]))
-        kwargs = {}
-        if exception.level >= logging.ERROR:
-            kwargs["exc_info"] = True
-        logger.log(exception.level, message, extra={'request': request}, **kwargs)
+        return _exception_payload(request, exception, web_page_url)
+    except Exception as e:
+        exception = APIException.error("Erreur lors du calcul du score.", internal_message=str(e))
+        return _exception_payload(request, exception, web_page_url)
+    finally:
+        connection.close()
+
+
+def _score_many(request, urls: List[str], asynchronous: bool) -> Iterator[Tuple[str, dict]]:
+    """
+    Give the results already known first, then the ones of the pages scored or queued, as soon as they are ready.
+    """
+    remaining_urls = []
+    for web_page_url in urls:
+        cached = page_cache.lookup(web_page_url)
+        if cached is not None:
+            yield web_page_url, json.loads(cached[1])
+        else:
+            remaining_urls.append(web_page_url)
+    if not remaining_urls:
+        return
+
+    web_pages = WebPage.get_fresh_many(remaining_urls, allow_stale=True)
+    for web_page_url, web_page in web_pages.items():
+        yield web_page_url, {
+            'status': 'success',
+            'data': web_page.to_dict()
+        }
+    remaining_urls = [web_page_url for web_page_url in remaining_urls if web_page_url not in web_pages]
+    if not remaining_urls:
+        return
+
+    if asynchronous:
+        for web_page_url in remaining_urls:
+            yield web_page_url, _job_payload(ScoringJob.enqueue(web_page_url))
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(settings.BATCH_WORKERS, len(remaining_urls)))
+    futures = {executor.submit(_compute_web_page, request, web_page_url): web_page_url
+               for web_page_url in remaining_urls}
+    try:
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # The client may have gone away, the pages not started yet are not needed anymore
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
 
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+def web_pages_score_view(request):
+    urls = _batch_urls(request)
+    if not urls:
+        logger.error('No URLs provided')
         return JsonResponse({
-            'status': LOG_LEVELS.get(exception.level, 'unknown'),
+            'status': 'error',
             'data': {
-                'message': exception.message
+                'message': 'No URLs provided'
             }
-        })
+        }, status=400)
+    if len(urls) > settings.BATCH_MAX_URLS:
+        return JsonResponse({
+            'status': 'error',
+            'data': {
+                'message': f'Too many URLs, the maximum is {settings.BATCH_MAX_URLS}'
+            }
+        }, status=400)
 
+    logger.info(f"Received request for {len(urls)} URLs")
+    # Under ASGI the results can't be streamed as they come, the pages to score are queued instead
+    asynchronous = (settings.ASYNC_SCORING or settings.ASYNC_VIEWS
+                    or request.GET.get('async', '').lower() in ('1', 'true'))
+    lines = (json.dumps(dict(url=web_page_url, **payload), cls=DjangoJSONEncoder) + '\n'
+             for web_page_url, payload in _score_many(request, urls, asynchronous))
+    return _streaming_response(lines, 'application/x-ndjson')
 
-def ping_view(request):
-    try:
-        page = str(WebPage.objects.last())
+
+def _event(name: str, data: dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+_stream_executor = None
+_stream_executor_lock = threading.Lock()
+
+
+def _get_stream_executor() -> ThreadPoolExecutor:
+    global _stream_executor
+    with _stream_executor_lock:
+        if _stream_executor is None:
+            _stream_executor = ThreadPoolExecutor(max_workers=settings.STREAM_WORKERS)
+        return _stream_executor
+
+
+def _progress_events(request, web_page_url: str) -> Iterator[str]:
+    """
+    Compute the scores in a thread of the stream executor and give an event for each of its steps,
+    then one with the same status and data as /api/page.
+    """
+    events = queue.Queue()
+
+    def progress(step: str, details: dict) -> None:
+        events.put((step, details))
+
+    def compute() -> None:
+        events.put(('result', _compute_web_page(request, web_page_url, progress)))
+
+    _get_stream_executor().submit(compute)
+    while True:
+        try:
+            step, details = events.get(timeout=settings.STREAM_KEEPALIVE_INTERVAL)
+        except queue.Empty:
+            # Comment line, so that proxies don't close the connection
+            yield ': keepalive\n\n'
+            continue
+        yield _event(step, details)
+        if step == 'result':
+            return
+
+
+def web_page_score_stream_view(request):
+    """
+    Same as web_page_score_view, with server-sent events telling the progress of the computation.
+    """
+    web_page_url = request.GET.get('url')
+    if not web_page_url:
+        logger.error('No URL provided')
         return JsonResponse({
-            'status': 'alive'
-        })
-    except Exception as e:
-        logger.critical(f"Error while trying to access DB when responding to healthcheck: {e}")
+            'status': 'error',
+            'data': {
+                'message': 'No URL provided'
+            }
+        }, status=400)
+
+    if settings.ASYNC_VIEWS:
+        # Django < 4.2 can't stream from an ASGI server without blocking the thread shared by the queries
         return JsonResponse({
-            'status': 'dead'
-        })
+            'status': 'error',
+            'data': {
+                'message': 'Streaming is not available, use /api/page?async=1 then /api/job instead'
+            }
+        }, status=501)
+
+    logger.info(f"Received streaming request for following URL : {web_page_url}")
+    cached = page_cache.lookup(web_page_url)
+    if cached is not None:
+        events = iter([_event('result', json.loads(cached[1]))])
+    else:
+        events = _progress_events(request, web_page_url)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Sent as they come through nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def job_status_view(request):
+    job_id = request.GET.get('id', '')
+    if not job_id.isdigit():
+        return JsonResponse({
+            'status': 'error',
+            'data': {
+                'message': 'No job id provided'
+            }
+        }, status=400)
+
+    job = ScoringJob.objects.select_related('web_page__base_domain').filter(pk=job_id).first()
+    if job is None:
+        return JsonResponse({
+            'status': 'error',
+            'data': {
+                'message': 'Unknown job'
+            }
+        }, status=404)
+
+    return _job_response(job)
+
+
+def ping_view(request):
+    """
+    Liveness probe, answered without the database.
+    """
+    return JsonResponse({
+        'status': 'alive',
+    })
+
+
+def ready_view(request):
+    """
+    Readiness probe, 503 when the process can't take more requests.
+    """
+    state = health.readiness()
+    state['http_pools'] = http_client.pool_stats()
+    return JsonResponse(state, status=200 if state['status'] == 'ready' else 503)
+
+
+def metrics_view(request):
+    """
+    Metrics of all the workers, in the Prometheus text format.
+    """
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
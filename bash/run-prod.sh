@@ -1,6 +1,22 @@
 #!/bin/sh
+# The metrics of the previous workers
+rm -rf "${METRICS_DIR:-/tmp/fake_news_detector_api_metrics}"
 yes yes | pipenv run python manage.py migrate && \
-pipenv run python manage.py clear_old_scores && \
-pipenv run python manage.py clear_empty_scores && \
-pipenv run python manage.py collectstatic --noinput && \
-LOAD_NLP="True" pipenv run gunicorn fake_news_detector_api.wsgi -b 0.0.0.0:8000 -t 600 -k gthread --threads 4 --log-file -
+pipenv run python manage.py collectstatic --noinput || exit 1
+# The maintenance of the scores runs while the requests are served. The pages whose fingerprints are still
+# valid, see WebPage.FINGERPRINTS_VALID_VERSIONS, are rescored before the old ones are deleted
+(pipenv run python manage.py rescore_from_fingerprints && \
+  pipenv run python manage.py clear_old_scores && \
+  pipenv run python manage.py clear_empty_scores && \
+  pipenv run python manage.py rebuild_domain_aggregates) &
+# The extracted articles cache is trimmed out of the requests
+(while true; do
+  pipenv run python manage.py article_cache_stats --evict > /dev/null
+  sleep "${EXTRACTED_ARTICLES_EVICTION_INTERVAL:-3600}"
+done) &
+if [ "${START_SCORING_WORKER:-False}" = "True" ]; then LOAD_NLP="True" pipenv run python manage.py score_worker & fi && \
+if [ "${ASYNC_VIEWS:-False}" = "True" ]; then
+  LOAD_NLP="True" pipenv run gunicorn fake_news_detector_api.asgi -b 0.0.0.0:8000 -t 600 -k uvicorn.workers.UvicornWorker --log-file -
+else
+  LOAD_NLP="True" pipenv run gunicorn fake_news_detector_api.wsgi -b 0.0.0.0:8000 -t 600 -k gthread --threads 4 --log-file -
+fi
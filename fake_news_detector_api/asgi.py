@@ -0,0 +1,16 @@
+"""
+ASGI config for fake_news_detector_api project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fake_news_detector_api.settings')
+
+application = get_asgi_application()
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 
 import os
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -92,6 +93,25 @@ WSGI_APPLICATION = 'fake_news_detector_api.wsgi.application'
 DATABASES = {
     'default': dj_database_url.config(default='sqlite:///' + os.path.join(BASE_DIR, 'db.sqlite3'), conn_max_age=600)
 }
+# The primary keys of the existing tables
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+# Caches the responses of the pages, which must be invalidated in every process: the default files are shared by
+# the processes of a node, a backend such as Memcached is needed with several nodes. LocMemCache is unsafe with
+# more than one process, the score_worker command included.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/fake_news_detector_api_cache'),
+    }
+}
+if 'memcached' not in CACHES['default']['BACKEND']:
+    # Django culls a part of the entries, 1 / CULL_FREQUENCY, when a write finds MAX_ENTRIES of them.
+    # The options would be given to the client of Memcached, which evicts its entries by itself.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '50000')),
+        'CULL_FREQUENCY': int(os.getenv('CACHE_CULL_FREQUENCY', '3')),
+    }
 
 if DEBUG:
     CORS_ORIGIN_ALLOW_ALL = True
@@ -174,3 +194,94 @@ MAILGUN_ACCESS_KEY = os.getenv('MAILGUN_ACCESS_KEY', '')
 MAILGUN_SERVER_NAME = os.getenv('MAILGUN_SERVER_NAME', '')
 
 LOAD_NLP = os.getenv('LOAD_NLP', 'False').lower() == 'true'
+
+# Scoring
+RELATED_ARTICLES_WORKERS = int(os.getenv('RELATED_ARTICLES_WORKERS', '8'))
+RELATED_ARTICLE_TIMEOUT = float(os.getenv('RELATED_ARTICLE_TIMEOUT', '20'))
+BASE_DOMAINS_CACHE_SIZE = int(os.getenv('BASE_DOMAINS_CACHE_SIZE', '10000'))
+EXTRACTED_ARTICLES_CACHE_TTL = int(os.getenv('EXTRACTED_ARTICLES_CACHE_TTL', '72'))  # hours
+EXTRACTED_ARTICLES_CACHE_SIZE = int(os.getenv('EXTRACTED_ARTICLES_CACHE_SIZE', '50000'))
+# Minutes during which the hits of a cached article are not written again
+EXTRACTED_ARTICLES_USED_AT_RESOLUTION = int(os.getenv('EXTRACTED_ARTICLES_USED_AT_RESOLUTION', '60'))
+SEARCH_RESULTS_CACHE_TTL = int(os.getenv('SEARCH_RESULTS_CACHE_TTL', '24'))  # hours
+# Search over 30 days only once and filter the 7 days window from the results
+BING_SINGLE_QUERY = os.getenv('BING_SINGLE_QUERY', 'False').lower() == 'true'
+
+# Outgoing HTTP requests
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '50'))  # number of hosts kept in the pool
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))  # connections kept per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '15'))
+HTTP_MAX_REDIRECTS = int(os.getenv('HTTP_MAX_REDIRECTS', '5'))
+
+# NLP
+NLP_BATCH_SIZE = int(os.getenv('NLP_BATCH_SIZE', '16'))
+# The locked spaCy 2.0 can only tag in the calling process, nlp.pipe has no n_process before 2.2
+if int(os.getenv('NLP_PROCESSES', '1')) > 1:
+    raise ImproperlyConfigured('NLP_PROCESSES above 1 is not supported by the installed spaCy version')
+STEMS_CACHE_SIZE = int(os.getenv('STEMS_CACHE_SIZE', '100000'))
+# Related articles sharing more than this estimated proportion of 3 words shingles with the article are
+# considered as copies. A page copying a part f of the article and as much text of its own has a proportion
+# of f / (2 - f), 0.15 for f = 0.26, close to a 0.3 ratio of difflib.SequenceMatcher without autojunk.
+# The benchmark_similarity command checks it against the cached articles, see api.similarity.sequence_ratio.
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', '0.15'))
+
+# Background scoring
+# Score the pages with the score_worker command instead of during the request, unless they are already scored
+ASYNC_SCORING = os.getenv('ASYNC_SCORING', 'False').lower() == 'true'
+SCORING_WORKER_CONCURRENCY = int(os.getenv('SCORING_WORKER_CONCURRENCY', '4'))
+SCORING_WORKER_POLL_INTERVAL = float(os.getenv('SCORING_WORKER_POLL_INTERVAL', '2'))  # seconds
+SCORING_JOB_TIMEOUT = int(os.getenv('SCORING_JOB_TIMEOUT', '900'))  # seconds before a running job is taken over
+# Jobs whose worker died this many times, probably because of the page, are marked as failed
+SCORING_JOB_MAX_ATTEMPTS = int(os.getenv('SCORING_JOB_MAX_ATTEMPTS', '3'))
+SCORING_JOBS_RETENTION = int(os.getenv('SCORING_JOBS_RETENTION', '24'))  # hours
+
+# Concurrent requests for the same page
+SINGLE_FLIGHT_WAIT = float(os.getenv('SINGLE_FLIGHT_WAIT', '60'))  # seconds waiting for a computation in progress
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv('SINGLE_FLIGHT_POLL_INTERVAL', '1'))  # seconds
+# Seconds the error of a failed computation is returned to the requests that waited for it
+COMPUTATION_FAILURE_TIMEOUT = int(os.getenv('COMPUTATION_FAILURE_TIMEOUT', '60'))
+SCORING_LEASE_DURATION = int(os.getenv('SCORING_LEASE_DURATION', '120'))  # seconds without heartbeat before takeover
+
+# Stale scores
+# Scores older than the soft limit (or computed by a previous version) are returned as stale and computed again in
+# the background, until they are older than the hard limit and computed during the request.
+SCORES_SOFT_MAX_AGE = int(os.getenv('SCORES_SOFT_MAX_AGE', '7'))  # days
+SCORES_HARD_MAX_AGE = int(os.getenv('SCORES_HARD_MAX_AGE', '30'))  # days
+STALE_REFRESH_WORKERS = int(os.getenv('STALE_REFRESH_WORKERS', '2'))
+
+# Responses of /api/page
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', '300'))  # seconds a serialized page is kept in the cache
+PAGE_CACHE_MAX_AGE = int(os.getenv('PAGE_CACHE_MAX_AGE', '3600'))  # seconds clients and proxies may keep a response
+
+# Batch endpoint
+BATCH_MAX_URLS = int(os.getenv('BATCH_MAX_URLS', '50'))
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', '4'))  # pages scored in parallel for one request
+
+# ASGI
+# Compute the scores of /api/page on the event loop, when served by fake_news_detector_api.asgi.
+# /api/pages then queues the pages to score, as with ASYNC_SCORING
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
+ASYNC_HTTP_CONNECTIONS = int(os.getenv('ASYNC_HTTP_CONNECTIONS', '200'))
+ASYNC_RELATED_ARTICLES_CONCURRENCY = int(os.getenv('ASYNC_RELATED_ARTICLES_CONCURRENCY', '20'))
+
+# Progress of the computations, streamed by /api/page/stream, which is not available with ASYNC_VIEWS
+STREAM_KEEPALIVE_INTERVAL = float(os.getenv('STREAM_KEEPALIVE_INTERVAL', '15'))  # seconds
+STREAM_WORKERS = int(os.getenv('STREAM_WORKERS', '8'))  # computations streamed at the same time by a process
+
+# Admission control of the computations of scores
+MAX_CONCURRENT_COMPUTATIONS = int(os.getenv('MAX_CONCURRENT_COMPUTATIONS', '4'))  # per process
+NODE_MAX_CONCURRENT_COMPUTATIONS = int(os.getenv('NODE_MAX_CONCURRENT_COMPUTATIONS', '0'))  # 0 for no limit
+ADMISSION_LOCK_DIR = os.getenv('ADMISSION_LOCK_DIR', '/tmp/fake_news_detector_api_slots')
+ADMISSION_NODE_POLL_INTERVAL = float(os.getenv('ADMISSION_NODE_POLL_INTERVAL', '0.2'))  # seconds
+ADMISSION_QUEUE_SIZE = int(os.getenv('ADMISSION_QUEUE_SIZE', '8'))  # computations waiting for a slot, per process
+ADMISSION_WAIT_TIMEOUT = float(os.getenv('ADMISSION_WAIT_TIMEOUT', '30'))  # seconds
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '30'))  # seconds, sent with the 503 responses
+
+# Readiness probe
+READINESS_DATABASE_CHECK_INTERVAL = float(os.getenv('READINESS_DATABASE_CHECK_INTERVAL', '5'))  # seconds
+
+# Metrics, written by every process in this directory so that /metrics sums the ones of all the workers,
+# empty to only expose the ones of the process answering
+METRICS_DIR = os.getenv('METRICS_DIR', '/tmp/fake_news_detector_api_metrics')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))  # seconds
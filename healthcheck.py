@@ -1,20 +1,19 @@
+import json
 import os
 import sys
+from urllib.request import urlopen
 
-import requests
-from requests import RequestException
 
-
-def main(timeout=10):
+def main(timeout=10, path='/api/ping'):
     port = os.getenv('PORT', 8000)
     try:
-        res = requests.get(f'http://127.0.0.1:{port}/api/ping', timeout=timeout)
-        res.raise_for_status()
+        with urlopen(f'http://127.0.0.1:{port}{path}', timeout=timeout) as res:
+            status = json.loads(res.read().decode()).get('status')
 
-        if res.json().get('status') != 'alive':
+        if status not in ('alive', 'ready'):
             sys.exit(1)
 
-    except RequestException:  # Covers at least timeout and status >= 400
+    except (OSError, ValueError):  # Covers at least timeout, status >= 400 and invalid JSON
         sys.exit(1)
 
 
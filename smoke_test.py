@@ -1,4 +1,4 @@
 from healthcheck import main
 
 if __name__ == '__main__':
-    main(120)
+    main(120, '/api/ready')